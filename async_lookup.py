@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+
+class AsyncRunner(QObject):
+    """
+    Runs slow functions (e.g. lookups over the network) in worker threads and calls
+    their callbacks with the results on the GUI thread. Results of functions started
+    before the latest call to cancel are discarded, so that a lookup for a word that
+    is no longer active can't overwrite what is shown.
+    """
+
+    # Emitted from a worker thread with the generation, the callback and the future
+    finished = pyqtSignal(int, object, object)
+
+    def __init__(self, max_workers=4):
+        super().__init__()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.generation = 0
+        self.stopped = False
+        # Signals emitted from other threads are delivered on the thread of this object
+        self.finished.connect(self.deliver)
+
+    def run(self, function, callback, *args):
+        """Call function(*args) in a worker thread and callback(result) when done"""
+        if self.stopped:
+            return
+        generation = self.generation
+        future = self.executor.submit(function, *args)
+        future.add_done_callback(
+            lambda future: self.finished.emit(generation, callback, future)
+        )
+
+    def deliver(self, generation, callback, future):
+        if self.stopped or generation != self.generation or future.cancelled():
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"An error occurred when looking up in the background: {e}")
+            return
+        callback(result)
+
+    def cancel(self):
+        """Discard the results of everything that has been started"""
+        self.generation += 1
+
+    def stop(self):
+        """Discard all results and cancel the functions that have not started"""
+        self.cancel()
+        self.stopped = True
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -3,6 +3,8 @@ import requests
 from PyQt5.QtGui import QInputMethodEvent, QTextCursor, QTextCharFormat, QColor
 from PyQt5.QtCore import Qt
 
+import http_client
+from prefix_index import PrefixIndex
 from text_field import TextField
 
 
@@ -25,7 +27,10 @@ class AutocompleteLineTextField(TextField):
         )
         self.use_web = use_web
         self.legilo_translator = legilo_translator
-        self.suggestions = set()
+        self.suggestions = PrefixIndex()
+        self.excluded_words = set()
+        # Suggestions found on the web, which are only kept for this text field
+        self.web_suggestions = PrefixIndex()
         self.current_suggestion = ""
         self.block_updates = True  # Flag to prevent recursion
         self.is_dead_key_active = False
@@ -40,8 +45,21 @@ class AutocompleteLineTextField(TextField):
         super().stop_edit()
         self.block_updates = True
 
-    def set_suggestions(self, suggestions):
+    def set_suggestions(self, suggestions, exclude_words=None):
+        """
+        Set the PrefixIndex with the suggestions, where the suggestions belonging to
+        the words in exclude_words are not used
+        """
         self.suggestions = suggestions
+        self.excluded_words = set(exclude_words) if exclude_words else set()
+        self.web_suggestions = PrefixIndex()
+
+    def find_suggestion(self, text):
+        """Get the first suggestion starting with text"""
+        suggestion = self.suggestions.find(text, self.excluded_words)
+        if suggestion is None:
+            suggestion = self.web_suggestions.find(text)
+        return suggestion
 
     def update_suggestion(self, get_from_web=False):
         if self.block_updates or self.is_dead_key_active:
@@ -77,9 +95,7 @@ class AutocompleteLineTextField(TextField):
                 self.add_wiktionary_suggestion(line_before_cursor)
 
         # Find a matching suggestion
-        matching = next(
-            (s for s in self.suggestions if s.startswith(line_before_cursor)), ""
-        )
+        matching = self.find_suggestion(line_before_cursor)
         if matching:
             self.insert_suggestion(matching[len(line_before_cursor) :])
 
@@ -158,8 +174,8 @@ class AutocompleteLineTextField(TextField):
         wiktionary_suggestion = self.get_wiktionary_suggestion(text)
         if not wiktionary_suggestion:
             return
-        if not any(suggestion.startswith(text) for suggestion in self.suggestions):
-            self.suggestions.add(wiktionary_suggestion)
+        if self.find_suggestion(text) is None:
+            self.web_suggestions.set(wiktionary_suggestion, wiktionary_suggestion)
 
     def get_wiktionary_suggestion(self, text):
         """
@@ -176,7 +192,7 @@ class AutocompleteLineTextField(TextField):
 
         response = None
         try:
-            response = requests.get(url, params=params, timeout=10).json()
+            response = http_client.get(url, params=params).json()
         except requests.exceptions.HTTPError as http_err:
             print(f"HTTP error occurred: {http_err}")
         except requests.exceptions.ConnectionError as conn_err:
@@ -211,5 +227,5 @@ class AutocompleteLineTextField(TextField):
         definition = trans["definitions"][0]["definition"]
         if not ":" in definition:
             definition = word + ": " + definition
-        if not any(suggestion.startswith(word) for suggestion in self.suggestions):
-            self.suggestions.add(definition)
+        if self.find_suggestion(word) is None:
+            self.web_suggestions.set(definition, definition)
@@ -0,0 +1,84 @@
+import threading
+import time
+from concurrent.futures import Future
+
+
+class AutoSaver:
+    """
+    Calls `save_function` in a background thread when no changes have been notified
+    for `delay` seconds, or at the latest `max_delay` seconds after the first unsaved
+    change, so that continuous changes are still saved regularly. Other slow tasks
+    can also be handed to the same thread with `run_task`.
+    """
+
+    def __init__(self, save_function, delay=3, max_delay=10):
+        self.save_function = save_function
+        self.delay = delay
+        self.max_delay = max_delay
+        self.condition = threading.Condition()
+        self.first_change = None
+        self.last_change = None
+        self.stopped = False
+        # Queue of (function, future) to run before the next save
+        self.tasks = []
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def notify_change(self):
+        with self.condition:
+            now = time.monotonic()
+            if self.first_change is None:
+                self.first_change = now
+            self.last_change = now
+            self.condition.notify()
+
+    def run_task(self, function):
+        """Call function in the background thread, and return a Future for its result"""
+        future = Future()
+        with self.condition:
+            self.tasks.append((function, future))
+            self.condition.notify()
+        return future
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.stopped and self.last_change is None and not self.tasks:
+                    self.condition.wait()
+                if self.tasks:
+                    # Tasks are run even after stopping, since someone may wait for them
+                    function, future = self.tasks.pop(0)
+                elif self.stopped:
+                    return
+                else:
+                    save_time = min(
+                        self.last_change + self.delay,
+                        self.first_change + self.max_delay,
+                    )
+                    remaining = save_time - time.monotonic()
+                    if remaining > 0:
+                        self.condition.wait(remaining)
+                        continue
+                    self.first_change = None
+                    self.last_change = None
+                    function, future = self.save_function, None
+            try:
+                result = function()
+            except Exception as e:
+                if future:
+                    future.set_exception(e)
+                else:
+                    print(f"An error occurred when saving automatically: {e}")
+            else:
+                if future:
+                    future.set_result(result)
+
+    def stop(self):
+        """
+        Stop the background thread after running the queued tasks, without saving
+        pending changes
+        """
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        self.thread.join()
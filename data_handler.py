@@ -1,61 +1,196 @@
 import os
 import pickle
 import unicodedata
+from concurrent.futures import Future
+
+from autosaver import AutoSaver
+from journal import Journal
+from payload_store import LazyInfoDict, lazy_info_dict_from_index
+from phrase_matcher import PhraseMatcher
+from prefix_index import PrefixIndex
+from sqlite_store import (
+    SQLitePhrases,
+    SQLiteStore,
+    SQLiteTranslations,
+    SQLiteWords,
+    SQLiteWordStatus,
+)
+from vocabulary_jsonl import export_vocabulary
+
+# The word lists that are modified by each recorded operation, except the word lists
+# of the categories, which are marked as modified when a word changes category
+MODIFIED_STORES = {
+    "add_to_known": [],
+    "add_to_learning": [],
+    "add_to_ignored": ["personal_translations"],
+    "add_personal_translation": ["personal_translations"],
+    "remove_personal_translation": ["personal_translations"],
+    "remove_word": ["personal_translations"],
+    "add_to_phrases": ["phrases"],
+    "remove_from_phrases": ["phrases"],
+}
+
+# Names of the word lists of the categories, as used for the dirty stores
+CATEGORY_STORE_NAMES = {
+    "known": "known_words",
+    "learning": "learning_words",
+    "ignored": "ignored_words",
+}
 
 
 class DataHandler:
-    def __init__(self, data_dir, language):
+    def __init__(self, data_dir, language, storage_engine="pickle"):
         self.data_dir = data_dir
         self.language = language
+        self.storage_engine = storage_engine
+        self.store = None
 
         self.known_words = {}
         self.learning_words = {}
-        self.ignored_words = []
+        self.ignored_words = {}  # Used as an ordered set, mapping word to None
         self.personal_translations = {}
         self.phrases = {}
         self.last_opened_files = []
 
-        self.load()
+        # Index mapping each word to its category ("learning", "known" or "ignored"),
+        # so that the category of a word is found in constant time
+        self.word_status = {}
+
+        # Automaton for finding all saved phrases in a text in one pass
+        self.phrase_matcher = PhraseMatcher()
+
+        # Autocompletion suggestions for known, learning and personally translated
+        # words, built on first use and then kept up to date
+        self.suggestion_index = None
+
+        # Mutations are appended to a journal when saving, and the full word lists
+        # are only written as a snapshot when the journal has grown large
+        self.history_dir = self.data_dir + "/" + self.language + "/" + "history"
+        self.journal = Journal(self.history_dir)
+        # The journal is compacted at this number of entries, or this size in bytes,
+        # since each entry may hold the full info of a word, which is replayed on load
+        self.journal_compaction_threshold = 5000
+        self.journal_compaction_size = 4 * 1024 * 1024
+        self.replaying_journal = False
+
+        # Word lists that have changed since they were last saved as a snapshot
+        self.dirty_stores = set()
+        # Journal size at the last explicit save, for discarding later changes
+        self.saved_journal_size = 0
+        self.autosaver = None
+        # Snapshot being written in the background, as (future, snapshot)
+        self.compaction = None
+
+        # The infos of known and learning words are stored in separate payload files
+        # and only decoded when accessed
+        self.payload_generations = {}
+        self.uses_legacy_word_lists = False
+
+        # Number of earlier versions of each saved file to keep, to fall back on if
+        # the latest version is corrupt
+        self.snapshot_generations = 3
+
+        if self.storage_engine == "sqlite":
+            self.open_sqlite_store()
+        else:
+            self.load()
+            self.convert_from_old_format()
+            self.saved_journal_size = self.journal.size()
 
-        # Convert data from old format
-        if len(self.personal_translations) == 0:
+    def open_sqlite_store(self):
+        """
+        Use an SQLite file as storage, where the word lists are read on demand. The
+        first time, the data is migrated from the pickle files.
+        """
+        store = SQLiteStore(self.history_dir + "/vocabulary.sqlite")
+        if not store.is_migrated():
+            self.load()
+            self.convert_from_old_format()
+            store.import_data(
+                self.known_words,
+                self.learning_words,
+                self.ignored_words,
+                self.personal_translations,
+                self.phrases,
+            )
+            print("The word lists were migrated to SQLite storage.")
+        self.store = store
+        self.known_words = SQLiteWords(store, "known")
+        self.learning_words = SQLiteWords(store, "learning")
+        self.ignored_words = SQLiteWords(store, "ignored")
+        self.word_status = SQLiteWordStatus(store)
+        self.personal_translations = SQLiteTranslations(store)
+        self.phrases = SQLitePhrases(store)
+        self.last_opened_files = store.get_metadata("last_opened_files", [])
+        self.build_phrase_matcher()
+
+    def convert_from_old_format(self):
+        """Convert data from old format"""
+        if self.uses_legacy_word_lists and len(self.personal_translations) == 0:
             self.convert_personal_translations_from_old_format()
             self.clean_lemmas_for_words()
 
     def add_to_known(self, word, info=None):
         """Add word to known words"""
-        if word in self.ignored_words:
-            self.ignored_words.remove(word)
-        elif word in self.learning_words:
-            del self.learning_words[word]
-        self.known_words[word] = info
+        self.set_category(word, "known", info)
+        self.record("add_to_known", word, info)
 
     def add_to_learning(self, word, info):
         """Add word to learning words"""
-        if word in self.ignored_words:
-            self.ignored_words.remove(word)
-        elif word in self.known_words:
-            del self.known_words[word]
-        self.learning_words[word] = info
+        self.set_category(word, "learning", info)
+        self.record("add_to_learning", word, info)
 
     def add_to_ignored(self, word):
         """Add word to ignored words"""
-        if word in self.known_words:
-            del self.known_words[word]
-        elif word in self.learning_words:
-            del self.learning_words[word]
         if word in self.personal_translations:
             del self.personal_translations[word]
-        self.ignored_words.append(word)
+        self.set_category(word, "ignored")
+        self.record("add_to_ignored", word)
+
+    def get_category(self, word):
+        """Get the category of word (learning, known, ignored or new)"""
+        return self.word_status.get(word, "new")
+
+    def get_category_store(self, category):
+        if category == "known":
+            return self.known_words
+        elif category == "learning":
+            return self.learning_words
+        elif category == "ignored":
+            return self.ignored_words
+        return None
+
+    def set_category(self, word, category, info=None):
+        """Move word to category, removing it from its previous category"""
+        self.remove_from_category(word)
+        self.get_category_store(category)[word] = info
+        self.dirty_stores.add(CATEGORY_STORE_NAMES[category])
+        if not self.store:  # With SQLite storage, the index is the words table
+            self.word_status[word] = category
+        self.update_suggestion(word)
+
+    def remove_from_category(self, word):
+        """Remove word from its category, if it has one"""
+        category = self.word_status.get(word)
+        if category:
+            del self.get_category_store(category)[word]
+            self.dirty_stores.add(CATEGORY_STORE_NAMES[category])
+            if not self.store:
+                del self.word_status[word]
+            self.update_suggestion(word)
 
     def add_personal_translation(self, word, personal_translation):
         """Add personal translation for word"""
         self.personal_translations[word] = personal_translation
+        self.update_suggestion(word)
+        self.record("add_personal_translation", word, personal_translation)
 
     def remove_personal_translation(self, word):
         """Remove personal translation for word"""
         if word in self.personal_translations:
             del self.personal_translations[word]
+            self.update_suggestion(word)
+            self.record("remove_personal_translation", word)
 
     def get_personal_translation(self, word):
         """Get personal translation for word"""
@@ -65,14 +200,11 @@ class DataHandler:
 
     def remove_word(self, word):
         """Remove word from data"""
-        if word in self.ignored_words:
-            self.ignored_words.remove(word)
-        elif word in self.learning_words:
-            del self.learning_words[word]
-        elif word in self.known_words:
-            del self.known_words[word]
+        self.remove_from_category(word)
         if word in self.personal_translations:
             del self.personal_translations[word]
+            self.update_suggestion(word)
+        self.record("remove_word", word)
 
     def add_to_phrases(self, info):
         phrase_words = info["phrase_words"]
@@ -80,21 +212,27 @@ class DataHandler:
             self.remove_from_phrases(info)
         first_word = phrase_words[0]
         if first_word in self.phrases:
-            self.phrases[first_word].append(info)
+            self.phrases[first_word] = self.phrases[first_word] + [info]
         else:
             self.phrases[first_word] = [info]
+        self.phrase_matcher.add(phrase_words)
+        self.record("add_to_phrases", info)
 
     def remove_from_phrases(self, info):
         phrase_words = info["phrase_words"]
         first_word = phrase_words[0]
         if first_word in self.phrases:
-            self.phrases[first_word] = [
+            remaining_phrases = [
                 phrase
                 for phrase in self.phrases[first_word]
                 if phrase["phrase_words"] != phrase_words
             ]
-        if not self.phrases[first_word]:
-            del self.phrases[first_word]
+            if remaining_phrases:
+                self.phrases[first_word] = remaining_phrases
+            else:
+                del self.phrases[first_word]
+        self.phrase_matcher.remove(phrase_words)
+        self.record("remove_from_phrases", info)
 
     def is_in_phrases(self, phrase_words):
         first_word = phrase_words[0]
@@ -112,81 +250,392 @@ class DataHandler:
                     return phrase
         return None
 
-    def get_all_words(self, include_translations=False, exclude_words=None):
-        all_words = set()
-        all_words |= self.known_words.keys()
-        all_words |= self.learning_words.keys()
-        all_words |= self.personal_translations.keys()
-        if exclude_words:
-            for word in exclude_words:
-                if word in all_words:
-                    all_words.remove(word)
-        if include_translations:
-            for word in all_words:
-                if word in self.personal_translations:
-                    all_words.remove(word)
-                    all_words.add(word + ": " + self.personal_translations[word])
-        return all_words
+    def get_suggestion_index(self):
+        """
+        Get the index of autocompletion suggestions, with the known, learning and
+        personally translated words, including the personal translations
+        """
+        if self.suggestion_index is None:
+            suggestions = {}
+            for words in [self.known_words, self.learning_words]:
+                for word in words:
+                    suggestions[word] = word
+            for word, personal_translation in self.personal_translations.items():
+                suggestions[word] = word + ": " + personal_translation
+            self.suggestion_index = PrefixIndex(suggestions)
+        return self.suggestion_index
+
+    def update_suggestion(self, word):
+        """Update the autocompletion suggestion for word after a change"""
+        if self.suggestion_index is None:
+            return
+        personal_translation = self.get_personal_translation(word)
+        if personal_translation:
+            self.suggestion_index.set(word, word + ": " + personal_translation)
+        elif self.get_category(word) in ["known", "learning"]:
+            self.suggestion_index.set(word, word)
+        else:
+            self.suggestion_index.remove(word)
+
+    def read_info(self, word):
+        """
+        Get the info of a word in any category, without keeping it decoded in memory
+        """
+        store = self.get_category_store(self.get_category(word))
+        if store is None:
+            return None
+        if isinstance(store, LazyInfoDict):
+            return store.read(word)
+        return store[word]
 
     def num_known_words(self):
         return len(self.known_words)
 
     def load(self):
         """Load all the word lists"""
+        self.known_words = self.load_info_dict("known_words")
+        self.learning_words = self.load_info_dict("learning_words")
         try:
-            self.known_words = self.load_from_history("known_words")
-        except:
-            self.known_words = {}
-        try:
-            self.learning_words = self.load_from_history("learning_words")
-        except:
-            self.learning_words = {}
-        try:
-            self.ignored_words = self.load_from_history("ignored_words")
-        except:
-            self.ignored_words = []
+            # Stored as a list, for compatibility with earlier versions
+            self.ignored_words = dict.fromkeys(self.load_from_history("ignored_words"))
+        except FileNotFoundError:
+            self.ignored_words = {}
         try:
             self.personal_translations = self.load_from_history("personal_translations")
-        except:
+        except FileNotFoundError:
             self.personal_translations = {}
         try:
             self.phrases = self.load_from_history("phrases")
-        except:
+        except FileNotFoundError:
             self.phrases = {}
+        self.build_word_status()
+        self.build_phrase_matcher()
+        self.replay_journal()
+
+    def build_word_status(self):
+        """
+        Build the index from word to category. If a word is found in several lists,
+        it is kept only in the one with highest precedence (learning, ignored, known).
+        """
+        self.word_status = {}
+        for category in ["learning", "ignored", "known"]:
+            store = self.get_category_store(category)
+            for word in list(store):
+                if word in self.word_status:
+                    del store[word]
+                else:
+                    self.word_status[word] = category
+
+    def build_phrase_matcher(self):
+        self.phrase_matcher = PhraseMatcher(
+            phrase["phrase_words"]
+            for phrases_for_word in self.phrases.values()
+            for phrase in phrases_for_word
+        )
+
+    def find_phrases(self, words):
+        """
+        Find all saved phrases in a list of words. Returns a list of
+        (start_position, phrase_words) tuples.
+        """
+        return [
+            (start_position, list(phrase_words))
+            for start_position, phrase_words in self.phrase_matcher.find(words)
+        ]
+
+    def load_info_dict(self, name):
+        """Load word list where the infos are read from a payload file on demand"""
+        try:
+            index_data = self.load_from_history(name + "_index")
+            self.payload_generations[name] = index_data["generation"]
+            return lazy_info_dict_from_index(
+                index_data["index"],
+                self.history_dir + "/" + index_data["payload_file"],
+                index_data.get("item_index"),
+            )
+        except FileNotFoundError:
+            pass
+        try:
+            # Earlier format, with all infos pickled together with the words
+            words = self.load_from_history(name)
+            self.uses_legacy_word_lists = True
+            self.dirty_stores.add(name)
+            return LazyInfoDict(words)
+        except FileNotFoundError:
+            return LazyInfoDict()
+
+    def write_info_dict(self, info_dict, name):
+        """
+        Save the infos of a word list to a new payload file, and then the index
+        pointing into it. Returns the path of the payload file and the indices.
+        """
+        if not os.path.exists(self.history_dir):
+            os.makedirs(self.history_dir)
+        generation = self.payload_generations.get(name, 0) + 1
+        payload_file_name = f"{name}.{generation}.payloads"
+        payload_path = self.history_dir + "/" + payload_file_name
+        index, item_index = info_dict.write(payload_path)
+        index_data = {
+            "payload_file": payload_file_name,
+            "generation": generation,
+            "index": index,
+            "item_index": item_index,
+        }
+        self.save_to_history(index_data, name + "_index")
+        self.payload_generations[name] = generation
+
+        # Remove files that are no longer used. The payload files of the earlier
+        # generations of the index are kept, since they are needed if loading falls
+        # back to one of them.
+        old_generation = generation - self.snapshot_generations - 1
+        old_payload_path = f"{self.history_dir}/{name}.{old_generation}.payloads"
+        if os.path.exists(old_payload_path):
+            os.remove(old_payload_path)
+        legacy_path = self.history_dir + "/" + name + ".pkl"
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+        return payload_path, index, item_index
+
+    def record(self, operation, *args):
+        """
+        Record a mutation in the journal, unless it comes from the journal itself.
+        With SQLite storage, the mutation is instead committed directly.
+        """
+        if self.store:
+            self.store.commit()
+            return
+        self.dirty_stores.update(MODIFIED_STORES[operation])
+        if not self.replaying_journal:
+            self.journal.append(operation, *args)
+            if self.autosaver:
+                self.autosaver.notify_change()
+
+    def start_autosave(self, delay=3):
+        """
+        Write recorded changes to the journal in a background thread when no changes
+        have been made for `delay` seconds. Not needed with SQLite storage, where each
+        change is committed directly.
+        """
+        if not self.store and not self.autosaver:
+            self.autosaver = AutoSaver(self.journal.flush, delay)
+
+    def stop_autosave(self):
+        if self.autosaver:
+            self.autosaver.stop()
+            self.autosaver = None
+
+    def close(self):
+        """Stop background saving and close open files"""
+        self.finish_compaction(wait=True)
+        self.stop_autosave()
+        if self.store:
+            self.store.close()
+        else:
+            self.known_words.close()
+            self.learning_words.close()
+
+    def discard_unsaved_changes(self):
+        """
+        Discard the changes made after the last call to save(), including the ones
+        already written to the journal by the autosaver
+        """
+        self.finish_compaction(wait=True)
+        self.stop_autosave()
+        if not self.store:
+            self.journal.discard_after(self.saved_journal_size)
+
+    def replay_journal(self):
+        """Apply the mutations recorded since the last snapshot"""
+        self.replaying_journal = True
+        try:
+            for operation, args in self.journal.replay():
+                getattr(self, operation)(*args)
+        finally:
+            self.replaying_journal = False
+
+    def flush(self):
+        """Write the recorded changes to disk, without compacting the journal"""
+        if self.store:
+            self.store.commit()
+        else:
+            self.journal.flush()
 
     def save(self):
-        """Save all the word lists and current state"""
-        self.save_to_history(self.known_words, "known_words")
-        self.save_to_history(self.learning_words, "learning_words")
-        self.save_to_history(self.ignored_words, "ignored_words")
-        self.save_to_history(self.personal_translations, "personal_translations")
-        self.save_to_history(self.phrases, "phrases")
-        self.save_to_history(self.last_opened_files, "last_opened_files")
+        """
+        Save the changes since the last save by appending them to the journal. When
+        the journal has grown large, it is compacted into a snapshot of all the word
+        lists.
+        """
+        if self.store:
+            self.store.set_metadata("last_opened_files", self.last_opened_files)
+            self.store.commit()
+            return
+        self.finish_compaction()
+        self.journal.flush()
+        if not self.compaction and (
+            self.journal.num_entries >= self.journal_compaction_threshold
+            or self.journal.size() >= self.journal_compaction_size
+            or self.uses_legacy_word_lists
+        ):
+            self.start_compaction()
+        self.saved_journal_size = self.journal.size()
+
+    def start_compaction(self):
+        """
+        Take a snapshot of the word lists that have changed since the last snapshot,
+        and write it and compact the journal in the background thread of the
+        autosaver, if it is running. Only the copying is done on the calling thread.
+        """
+        self.journal.flush()
+        snapshot = {}
+        for name in ["known_words", "learning_words"]:
+            if name in self.dirty_stores:
+                snapshot[name] = getattr(self, name).snapshot()
+        if "ignored_words" in self.dirty_stores:
+            snapshot["ignored_words"] = self.dump_pickle(list(self.ignored_words))
+        for name in ["personal_translations", "phrases"]:
+            if name in self.dirty_stores:
+                snapshot[name] = self.dump_pickle(getattr(self, name))
+        snapshot["last_opened_files"] = self.dump_pickle(self.last_opened_files)
+        journal_size = self.journal.size()
+        num_entries = self.journal.num_entries
+        self.dirty_stores = set()
+        self.uses_legacy_word_lists = False
+
+        def write_snapshot():
+            written_info_dicts = {}
+            for name, data in snapshot.items():
+                if isinstance(data, LazyInfoDict):
+                    written_info_dicts[name] = self.write_info_dict(data, name)
+                else:
+                    self.save_pickled_to_file(data, name, self.history_dir)
+            self.journal.remove_before(journal_size, num_entries)
+            return written_info_dicts
+
+        if self.autosaver:
+            future = self.autosaver.run_task(write_snapshot)
+        else:
+            future = Future()
+            try:
+                future.set_result(write_snapshot())
+            except Exception as e:
+                future.set_exception(e)
+        self.compaction = (future, snapshot)
+
+    def finish_compaction(self, wait=False):
+        """
+        Switch the word lists to the payload files written by the last compaction,
+        if it is done. If it failed, the journal is kept and the word lists are
+        saved again at the next compaction.
+        """
+        if not self.compaction:
+            return
+        future, snapshot = self.compaction
+        if not wait and not future.done():
+            return
+        self.compaction = None
+        try:
+            written_info_dicts = future.result()
+        except Exception as e:
+            print(f"An error occurred when saving a snapshot of the word lists: {e}")
+            self.dirty_stores.update(snapshot)
+            self.dirty_stores.discard("last_opened_files")
+            return
+        for name, (path, index, item_index) in written_info_dicts.items():
+            getattr(self, name).switch_to(path, index, item_index, snapshot[name])
 
     def save_as_txt(self):
-        """Save all the word lists as txt files"""
-        self.save_object_as_txt(self.known_words, "known_words_dict")
-        self.save_object_as_txt(self.learning_words, "learning_words_dict")
-        self.save_object_as_txt(
-            self.personal_translations, "personal_translations_dict"
+        """
+        Save all the word lists as txt files, and all the data as a JSON Lines file
+        with one record per word or phrase
+        """
+        export_vocabulary(
+            self,
+            self.data_dir + "/" + self.language + "/" + "export/vocabulary.jsonl",
         )
-        self.save_object_as_txt(self.phrases, "phrases_dict")
         self.save_list_as_txt(list(self.known_words.keys()), "known_words_list")
         self.save_list_as_txt(list(self.learning_words.keys()), "learning_words_list")
-        self.save_list_as_txt(self.ignored_words, "ignored_words_list")
+        self.save_list_as_txt(list(self.ignored_words), "ignored_words_list")
+
+    def dump_pickle(self, obj):
+        return pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
 
     def save_to_file(self, obj, name, directory):
+        """Save object as a pickle file"""
+        self.save_pickled_to_file(self.dump_pickle(obj), name, directory)
+
+    def save_pickled_to_file(self, data, name, directory):
+        """
+        Save pickled data atomically: it is written to a temporary file which replaces the
+        saved file when completely written, so that an interrupted save never leaves a
+        partially written file. Earlier versions are kept as name.1.pkl, name.2.pkl
+        and so on.
+        """
         # Create directory if it doesn't exist
         if not os.path.exists(directory):
             os.makedirs(directory)
 
-        with open(directory + "/" + name + ".pkl", "wb") as f:
-            pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+        path = directory + "/" + name + ".pkl"
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # Rotate earlier versions, from the oldest to the newest
+        for generation in range(self.snapshot_generations, 0, -1):
+            if generation == 1:
+                older_path = path
+            else:
+                older_path = self.generation_path(name, directory, generation - 1)
+            if os.path.exists(older_path):
+                os.replace(
+                    older_path, self.generation_path(name, directory, generation)
+                )
+        os.replace(temp_path, path)
+        self.sync_directory(directory)
 
     def load_from_file(self, name, directory):
-        """General function for loading files"""
-        with open(directory + "/" + name + ".pkl", "rb") as f:
-            return pickle.load(f)
+        """
+        General function for loading files. If the latest version of the file is
+        corrupt, the newest earlier version that can be read is loaded instead.
+        """
+        paths = [directory + "/" + name + ".pkl"]
+        for generation in range(1, self.snapshot_generations + 1):
+            paths.append(self.generation_path(name, directory, generation))
+        error = None
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, "rb") as f:
+                    obj = pickle.load(f)
+            except Exception as e:
+                print(f"Could not read {path}: {e}")
+                error = e
+                continue
+            if error:
+                print(f"Loaded {name} from the earlier version {path}")
+            return obj
+        if error:
+            raise error
+        raise FileNotFoundError(f"No saved file found for {name} in {directory}")
+
+    def generation_path(self, name, directory, generation):
+        return directory + "/" + name + "." + str(generation) + ".pkl"
+
+    def sync_directory(self, directory):
+        """Make renames in directory durable, on systems where this is supported"""
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
 
     def save_to_txt(self, text, file_name, directory):
         """Save to .txt file"""
@@ -211,14 +660,6 @@ class DataHandler:
         )
         return obj
 
-    def save_object_as_txt(self, obj, name):
-        """Save word list object as txt file"""
-        self.save_to_txt(
-            str(obj),
-            name + ".txt",
-            self.data_dir + "/" + self.language + "/" + "txt_word_dicts",
-        )
-
     def save_list_as_txt(self, list, name):
         """Save word list as txt file with one word per line"""
         self.save_to_txt(
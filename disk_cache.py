@@ -0,0 +1,133 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+
+class DiskCache:
+    """
+    Persistent key-value cache in an SQLite file. Entries can have an expiry time,
+    and when the total size of the values exceeds `max_size` bytes, the least
+    recently used entries are removed.
+    """
+
+    def __init__(self, path, max_size=200 * 1024 * 1024):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self.max_size = max_size
+        # The cache may be used from several threads, one at a time
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires REAL,
+                    last_access REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+                """
+            )
+        row = self.connection.execute("SELECT SUM(size) FROM entries").fetchone()
+        self.total_size = row[0] or 0
+
+    def get(self, key, allow_expired=False):
+        """
+        Get the value for key, or None if there is no such entry or if it has
+        expired (unless allow_expired is True)
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value, expires FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires = row
+            if not allow_expired and expires is not None and expires < time.time():
+                return None
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE entries SET last_access = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+        return pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        """Store value for key, expiring after `ttl` seconds if given"""
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        expires = now + ttl if ttl is not None else None
+        with self.lock:
+            with self.connection:
+                self.total_size -= self.get_size(key)
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO entries "
+                    + "(key, value, size, expires, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, data, len(data), expires, now),
+                )
+                self.total_size += len(data)
+                if self.total_size > self.max_size:
+                    self.evict()
+
+    def delete(self, key):
+        with self.lock:
+            with self.connection:
+                self.total_size -= self.get_size(key)
+                self.connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix):
+        """Remove all entries whose keys start with prefix, returning their number"""
+        # Compared as a key range, so that characters in the prefix have no meaning
+        end = prefix + "\U0010ffff"
+        with self.lock:
+            with self.connection:
+                row = self.connection.execute(
+                    "SELECT COUNT(*), SUM(size) FROM entries WHERE key >= ? AND key < ?",
+                    (prefix, end),
+                ).fetchone()
+                self.connection.execute(
+                    "DELETE FROM entries WHERE key >= ? AND key < ?", (prefix, end)
+                )
+                self.total_size -= row[1] or 0
+        return row[0]
+
+    def clear(self):
+        with self.lock:
+            with self.connection:
+                self.connection.execute("DELETE FROM entries")
+                self.total_size = 0
+
+    def get_size(self, key):
+        row = self.connection.execute(
+            "SELECT size FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the total size is at most 90 %
+        of the max size, so that eviction isn't needed on every new entry
+        """
+        target_size = self.max_size * 0.9
+        rows = self.connection.execute(
+            "SELECT key, size FROM entries ORDER BY last_access"
+        )
+        keys_to_remove = []
+        for key, size in rows:
+            if self.total_size <= target_size:
+                break
+            keys_to_remove.append((key,))
+            self.total_size -= size
+        self.connection.executemany("DELETE FROM entries WHERE key = ?", keys_to_remove)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
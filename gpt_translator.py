@@ -2,8 +2,19 @@ import os
 import json
 from openai import OpenAI
 
+# Max number of words or sentences to translate in one request
+MAX_BATCH_SIZE = 20
+
+# Max number of characters of the context given for each word in a batch
+MAX_CONTEXT_LENGTH = 200
+
 
 class GPTTranslator:
+    MODEL = "gpt-4o"
+    # Increase when the prompts or tool schemas are changed, so that translations
+    # made with earlier versions are not used from the cache
+    PROMPT_VERSION = 1
+
     def __init__(self, src, dest):
         self.src = src.capitalize()
         self.dest = dest.capitalize()
@@ -17,6 +28,22 @@ class GPTTranslator:
         self.client = OpenAI(api_key=api_key)
 
         # Define the function (tool) schema for word translation
+        word_properties = {
+            "base_form": {
+                "type": "string",
+                "description": (
+                    f"The base (dictionary) form of the word in {self.src}."
+                ),
+            },
+            "translations": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": (
+                    f"Likely {self.dest} translations of the base {self.src} word, "
+                    "even if the word is rare or has multiple meanings."
+                ),
+            },
+        }
         self.tools_word = [
             {
                 "type": "function",
@@ -27,27 +54,46 @@ class GPTTranslator:
                         f"its common translations into {self.dest}. "
                         "If the word is unclear, guess the most likely interpretation."
                     ),
+                    "parameters": {
+                        "type": "object",
+                        "properties": word_properties,
+                        "required": ["base_form", "translations"],
+                    },
+                },
+            }
+        ]
+
+        # Define the function (tool) schema for translating several words at once
+        self.tools_word_batch = [
+            {
+                "type": "function",
+                "function": {
+                    "name": "translate_words",
+                    "description": (
+                        f"Gets the dictionary forms of several {self.src} words and "
+                        f"provides their common translations into {self.dest}. "
+                        "If a word is unclear, guess the most likely interpretation."
+                    ),
                     "parameters": {
                         "type": "object",
                         "properties": {
-                            "base_form": {
-                                "type": "string",
-                                "description": (
-                                    "The base (dictionary) form of the word in "
-                                    f"{self.src}."
-                                ),
-                            },
-                            "translations": {
+                            "results": {
                                 "type": "array",
-                                "items": {"type": "string"},
-                                "description": (
-                                    f"Likely {self.dest} translations of the base "
-                                    f"{self.src} word, even if the word is rare or "
-                                    "has multiple meanings."
-                                ),
+                                "description": "One result per word, in order.",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "word": {
+                                            "type": "string",
+                                            "description": "The word, as given.",
+                                        },
+                                        **word_properties,
+                                    },
+                                    "required": ["word", "base_form", "translations"],
+                                },
                             },
                         },
-                        "required": ["base_form", "translations"],
+                        "required": ["results"],
                     },
                 },
             }
@@ -79,6 +125,46 @@ class GPTTranslator:
             }
         ]
 
+        # Define the function (tool) schema for translating several sentences at once
+        self.tools_phrase_batch = [
+            {
+                "type": "function",
+                "function": {
+                    "name": "translate_sentences",
+                    "description": (
+                        f"Translates several phrases or sentences from {self.src} "
+                        f"into {self.dest}."
+                    ),
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "results": {
+                                "type": "array",
+                                "description": "One result per sentence, in order.",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "text": {
+                                            "type": "string",
+                                            "description": "The sentence, as given.",
+                                        },
+                                        "translation": {
+                                            "type": "string",
+                                            "description": f"Accurate and "
+                                            f"natural-sounding {self.dest} "
+                                            "translation of the sentence.",
+                                        },
+                                    },
+                                    "required": ["text", "translation"],
+                                },
+                            },
+                        },
+                        "required": ["results"],
+                    },
+                },
+            }
+        ]
+
     def translate(self, word: str):
         num_words = len(word.split())
         if num_words == 1:
@@ -103,7 +189,7 @@ class GPTTranslator:
             )
         try:
             response = self.client.chat.completions.create(
-                model="gpt-4o",
+                model=self.MODEL,
                 messages=[
                     {
                         "role": "user",
@@ -126,6 +212,114 @@ class GPTTranslator:
         except Exception as e:
             return {"error": str(e)}
 
+    def translate_batch(self, words, contexts=None):
+        """
+        Translate several words or sentences with one request per batch, returning
+        the results in the same format and order as translate. `contexts` may give
+        the sentence where each word occurs. Words without a valid result in the
+        response are translated one at a time.
+        """
+        if contexts is None:
+            contexts = [None] * len(words)
+        results = [None] * len(words)
+        single_words = []
+        phrases = []
+        for i, word in enumerate(words):
+            if len(word.split()) == 1:
+                single_words.append(i)
+            else:
+                phrases.append(i)
+        for indices, is_phrase in [(single_words, False), (phrases, True)]:
+            for start in range(0, len(indices), MAX_BATCH_SIZE):
+                batch = indices[start : start + MAX_BATCH_SIZE]
+                batch_results = self.request_batch(
+                    [words[i] for i in batch], [contexts[i] for i in batch], is_phrase
+                )
+                for i, result in zip(batch, batch_results):
+                    results[i] = result
+        for i, word in enumerate(words):
+            if results[i] is None:
+                results[i] = self.translate(word)
+        return results
+
+    def request_batch(self, words, contexts, is_phrase):
+        """
+        Send one request for the words, returning their results in order, with None
+        for the words that the response has no valid result for
+        """
+        if is_phrase:
+            tools = self.tools_phrase_batch
+            temperature = 0.5
+            top_p = 0.9
+            lines = [f"{i}. {repr(word)}" for i, word in enumerate(words, start=1)]
+            message = (
+                f"Translate each of the following sentences from {self.src} to "
+                f"{self.dest}. Use natural, idiomatic {self.dest}. Give one result "
+                "per sentence, in the same order.\n" + "\n".join(lines)
+            )
+            input_key = "text"
+            result_keys = ["translation"]
+        else:
+            tools = self.tools_word_batch
+            temperature = 0.1
+            top_p = 1.0
+            lines = []
+            for i, (word, context) in enumerate(zip(words, contexts), start=1):
+                line = f"{i}. {repr(word)}"
+                if context:
+                    line += f" (in: {repr(context[:MAX_CONTEXT_LENGTH])})"
+                lines.append(line)
+            message = (
+                f"For each of the following {self.src} words, identify its base "
+                f"(dictionary) form in {self.src} and provide several common "
+                f"translations into {self.dest}. Use the sentence the word occurs "
+                "in, if given, to find the right meaning. "
+                "If you are unsure, make a best guess based on similar words. "
+                "Give one result per word, in the same order.\n" + "\n".join(lines)
+            )
+            input_key = "word"
+            result_keys = ["base_form", "translations"]
+        try:
+            response = self.client.chat.completions.create(
+                model=self.MODEL,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": message,
+                    }
+                ],
+                tools=tools,
+                tool_choice={
+                    "type": "function",
+                    "function": {"name": tools[0]["function"]["name"]},
+                },
+                temperature=temperature,
+                top_p=top_p,
+            )
+
+            tool_calls = response.choices[0].message.tool_calls
+            if not tool_calls:
+                return [None] * len(words)
+            items = json.loads(tool_calls[0].function.arguments)["results"]
+        except Exception as e:
+            print(f"Batch translation failed, translating one at a time: {e}")
+            return [None] * len(words)
+
+        results = [None] * len(words)
+        for i, item in enumerate(items):
+            if not isinstance(item, dict) or any(k not in item for k in result_keys):
+                continue
+            # Match the results by the given word, in case the order has changed
+            if i < len(words) and item.get(input_key) == words[i]:
+                index = i
+            elif item.get(input_key) in words:
+                index = words.index(item[input_key])
+            else:
+                continue
+            if results[index] is None:
+                results[index] = {key: item[key] for key in result_keys}
+        return results
+
 
 def run_language_lookup_loop():
     src = "Croatian"
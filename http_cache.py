@@ -0,0 +1,69 @@
+import requests
+
+import http_client
+from disk_cache import DiskCache
+
+
+class CachedResponse:
+    """The parts of an HTTP response that are kept in the cache"""
+
+    def __init__(self, url, status_code, content, etag=None, last_modified=None):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+class HTTPCache:
+    """
+    Cache of successful GET responses, stored on disk and keyed by URL. Responses
+    younger than `ttl` seconds are used directly. Older ones are revalidated with the
+    server using their ETag or Last-Modified header, and are used if the server can't
+    be reached.
+    """
+
+    def __init__(self, path, ttl=7 * 24 * 60 * 60, max_size=200 * 1024 * 1024):
+        self.cache = DiskCache(path, max_size)
+        self.ttl = ttl
+
+    def get(self, url, headers=None, timeout=http_client.DEFAULT_TIMEOUT):
+        """
+        Get the response for url, from the cache if possible. Raises the exceptions
+        of requests if the server can't be reached and there is no cached response.
+        """
+        cached = self.cache.get(url)
+        if cached:
+            return cached
+
+        stale = self.cache.get(url, allow_expired=True)
+        request_headers = dict(headers) if headers else {}
+        if stale:
+            if stale.etag:
+                request_headers["If-None-Match"] = stale.etag
+            if stale.last_modified:
+                request_headers["If-Modified-Since"] = stale.last_modified
+        try:
+            response = http_client.get(url, headers=request_headers, timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            if stale:
+                print(f"Using cached response for {url}, since the request failed: {e}")
+                return stale
+            raise
+
+        if response.status_code == 304 and stale:
+            self.cache.set(url, stale, self.ttl)
+            return stale
+        cached = CachedResponse(
+            url,
+            response.status_code,
+            response.content,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+        if response.status_code == 200:
+            self.cache.set(url, cached, self.ttl)
+        return cached
+
+    def close(self):
+        self.cache.close()
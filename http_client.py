@@ -0,0 +1,40 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+USER_AGENT = "Legilo (https://github.com/christianrosdahl/legilo)"
+DEFAULT_TIMEOUT = 10  # Seconds
+
+# Number of hosts to keep connections to, and max number of connections per host
+MAX_POOLED_HOSTS = 10
+MAX_CONNECTIONS_PER_HOST = 8
+
+session = None
+session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Get the session shared by all network requests, which keeps connections alive
+    so that repeated requests to the same host don't need new TCP and TLS handshakes
+    """
+    global session
+    with session_lock:
+        if session is None:
+            session = requests.Session()
+            # Requests wait for a free connection when a host has too many
+            adapter = HTTPAdapter(
+                pool_connections=MAX_POOLED_HOSTS,
+                pool_maxsize=MAX_CONNECTIONS_PER_HOST,
+                pool_block=True,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+def get(url, params=None, headers=None, timeout=DEFAULT_TIMEOUT):
+    """Send a GET request using the shared session"""
+    return get_session().get(url, params=params, headers=headers, timeout=timeout)
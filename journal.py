@@ -0,0 +1,118 @@
+import os
+import pickle
+import threading
+
+
+class Journal:
+    """
+    Append-only log of data mutations. Each record is pickled separately, so that
+    appending only costs in proportion to the number of changes, and the records
+    can be replayed on top of the last snapshot when loading.
+    """
+
+    def __init__(self, directory, name="journal"):
+        self.directory = directory
+        self.path = directory + "/" + name + ".pkl"
+        self.pending = []
+        self.num_entries = 0
+        # Offsets count all records written since the journal was opened, including
+        # the ones that have been removed from the start of the file
+        self.base_offset = 0
+        # Records may be appended from one thread and flushed from another
+        self.pending_lock = threading.Lock()
+        self.file_lock = threading.Lock()
+
+    def append(self, operation, *args):
+        """Add a record to be written at the next flush"""
+        # Serialize immediately, so that later in-place changes of the arguments
+        # don't change what is recorded
+        record = pickle.dumps((operation, args), pickle.HIGHEST_PROTOCOL)
+        with self.pending_lock:
+            self.pending.append(record)
+
+    def flush(self):
+        """Write pending records to the end of the journal file"""
+        with self.file_lock:
+            with self.pending_lock:
+                records = self.pending
+                self.pending = []
+            if not records:
+                return
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            with open(self.path, "ab") as f:
+                for record in records:
+                    f.write(record)
+                f.flush()
+                os.fsync(f.fileno())
+            self.num_entries += len(records)
+
+    def size(self):
+        """
+        Size in bytes of the records written to the journal, which is the offset of
+        the next record
+        """
+        with self.file_lock:
+            return self.base_offset + self.file_size()
+
+    def file_size(self):
+        if not os.path.exists(self.path):
+            return 0
+        return os.path.getsize(self.path)
+
+    def discard_after(self, size):
+        """Remove pending records and records written after the first `size` bytes"""
+        with self.file_lock:
+            with self.pending_lock:
+                self.pending = []
+            if self.file_size() > size - self.base_offset:
+                with open(self.path, "r+b") as f:
+                    f.truncate(max(size - self.base_offset, 0))
+
+    def replay(self):
+        """Yield all records in the journal file as (operation, args) tuples"""
+        self.num_entries = 0
+        if not os.path.exists(self.path):
+            return
+        corrupt_from = None
+        file_size = os.path.getsize(self.path)
+        with open(self.path, "rb") as f:
+            while True:
+                record_start = f.tell()
+                try:
+                    operation, args = pickle.load(f)
+                except EOFError:
+                    if record_start < file_size:
+                        corrupt_from = record_start
+                    break
+                except Exception as e:
+                    # A record that was only partially written, e.g. due to a crash
+                    print(f"Stopped reading journal at a corrupt record: {e}")
+                    corrupt_from = record_start
+                    break
+                self.num_entries += 1
+                yield operation, args
+        if corrupt_from is not None:
+            # Cut off the corrupt tail, so that new records can be read after it
+            with open(self.path, "r+b") as f:
+                f.truncate(corrupt_from)
+
+    def remove_before(self, size, num_entries):
+        """
+        Remove the first `num_entries` records, written in the first `size` bytes,
+        e.g. after they have been saved as a snapshot. Records written later are kept.
+        """
+        with self.file_lock:
+            self.num_entries -= num_entries
+            if not os.path.exists(self.path):
+                return
+            with open(self.path, "rb") as f:
+                f.seek(size - self.base_offset)
+                later_records = f.read()
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "wb") as f:
+                f.write(later_records)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            self.base_offset = size
@@ -0,0 +1,98 @@
+import copy
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class LookupPrefetcher:
+    """
+    Looks up words in background threads before they are needed, so that the results
+    are ready when the words are looked up. The words may be any keys that the lookup
+    function takes, e.g. a word together with its lemma. Prefetching a new list of
+    words cancels the lookups that have not started yet. If a batch function is
+    given, it is called with all new words to prefetch (and their contexts) before
+    they are looked up one at a time, e.g. to translate them with one request.
+    """
+
+    def __init__(
+        self, lookup_function, max_workers=2, max_results=500, batch_function=None
+    ):
+        self.lookup_function = lookup_function
+        self.batch_function = batch_function
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.max_results = max_results
+        self.lock = threading.Lock()
+        # Maps word to the future of its lookup, with the most recent last
+        self.futures = OrderedDict()
+
+    def prefetch(self, words, contexts=None):
+        """
+        Look up the words in order, replacing any previous words to prefetch.
+        `contexts` may give a context for each word to the batch function.
+        """
+        if contexts is None:
+            contexts = [None] * len(words)
+        with self.lock:
+            for word, future in list(self.futures.items()):
+                if future.cancel():
+                    del self.futures[word]
+            new_words = []
+            new_contexts = []
+            for word, context in zip(words, contexts):
+                if word not in self.futures and word not in new_words:
+                    new_words.append(word)
+                    new_contexts.append(context)
+            if self.batch_function and new_words:
+                self.executor.submit(self.run_batch, new_words, new_contexts)
+            for word in new_words:
+                self.futures[word] = self.executor.submit(self.look_up, word)
+            while len(self.futures) > self.max_results:
+                self.futures.popitem(last=False)
+
+    def look_up(self, word):
+        try:
+            return self.lookup_function(word)
+        except Exception as e:
+            print(f"An error occurred when prefetching the lookup of '{word}': {e}")
+            return None
+
+    def run_batch(self, words, contexts):
+        try:
+            self.batch_function(words, contexts)
+        except Exception as e:
+            print(f"An error occurred when prefetching a batch of words: {e}")
+
+    def get(self, word):
+        """
+        Get the result for word if it has been prefetched, waiting for it if the
+        lookup has started. Returns None if the word has not been prefetched.
+        """
+        with self.lock:
+            future = self.futures.get(word)
+            if future is None:
+                return None
+            if future.cancel():  # Not started, so it is faster to look it up directly
+                del self.futures[word]
+                return None
+        result = future.result()
+        if result is None:  # The lookup failed, so it should be made again
+            with self.lock:
+                if self.futures.get(word) is future:
+                    del self.futures[word]
+            return None
+        # The caller may change the result, so that it can't be reused directly
+        return copy.deepcopy(result)
+
+    def clear(self):
+        """
+        Discard all prefetched results, e.g. when lookups would give other results
+        now, and cancel the lookups that have not started
+        """
+        with self.lock:
+            for future in self.futures.values():
+                future.cancel()
+            self.futures.clear()
+
+    def stop(self):
+        """Cancel all lookups that have not started"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Persistent cache of machine translations from Google Translate and GPT, so that the
+same text is never translated twice with the same settings.
+
+Usage:
+    python machine_translation_cache.py purge [--provider GPT] [--data-dir data]
+"""
+
+import argparse
+import json
+
+from disk_cache import DiskCache
+
+# Max total size in bytes of the cached translations, before the least recently used
+# ones are removed
+MAX_CACHE_SIZE = 50 * 1024 * 1024
+
+
+def get_default_path(data_dir):
+    return data_dir + "/general/machine_translation_cache.sqlite"
+
+
+class MachineTranslationCache:
+    """
+    Cache of machine translations, keyed by the provider, the model and prompt
+    version used, the source and destination languages and the translated text.
+    The entries don't expire, but the least recently used ones are evicted.
+    """
+
+    def __init__(self, path, max_size=MAX_CACHE_SIZE):
+        self.cache = DiskCache(path, max_size)
+
+    def get_key(self, provider, model, prompt_version, src, dest, text):
+        # The key is JSON, so that no part can be confused with another
+        return provider + ":" + json.dumps([model, prompt_version, src, dest, text])
+
+    def get(self, provider, model, prompt_version, src, dest, text):
+        """Get the cached translation of text, or None if it isn't cached"""
+        key = self.get_key(provider, model, prompt_version, src, dest, text)
+        return self.cache.get(key)
+
+    def set(self, provider, model, prompt_version, src, dest, text, translation):
+        key = self.get_key(provider, model, prompt_version, src, dest, text)
+        self.cache.set(key, translation)
+
+    def purge(self, provider=None):
+        """
+        Remove the cached translations of provider, or all if no provider is given.
+        Returns the number of removed translations, or None if all were removed.
+        """
+        if provider is None:
+            self.cache.clear()
+            return None
+        return self.cache.delete_prefix(provider + ":")
+
+    def close(self):
+        self.cache.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the machine translation cache")
+    parser.add_argument("command", choices=["purge"])
+    parser.add_argument(
+        "--provider",
+        help="provider whose translations to remove, e.g. Google or GPT "
+        + "(default: all)",
+    )
+    parser.add_argument("--data-dir", default="data")
+    args = parser.parse_args()
+
+    cache = MachineTranslationCache(get_default_path(args.data_dir))
+    try:
+        num_removed = cache.purge(args.provider)
+        if num_removed is None:
+            print("Removed all cached machine translations")
+        else:
+            print(f"Removed {num_removed} cached machine translations")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
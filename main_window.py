@@ -7,7 +7,7 @@ import unicodedata
 
 from functools import partial
 from gtts import gTTS  # Generate mp3 files with Google's text-to-speech
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QColor, QFont, QKeySequence, QTextCharFormat, QTextCursor
 from PyQt5.QtWidgets import (
     QAction,
@@ -26,12 +26,13 @@ from PyQt5.QtWidgets import (
 
 os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = ""
 import pygame  # Play mp3 files from gtts
-from googletrans import Translator
 
+from async_lookup import AsyncRunner
 from browser_controller import BrowserController
 from data_handler import DataHandler
 from edit_lemmas_text_field import EditLemmasTextField
 from language_code import get_language_code
+from lookup_prefetcher import LookupPrefetcher
 from sentence import get_first_sentence, get_sentences
 from styling import get_styling
 from text_field import TextField
@@ -40,8 +41,12 @@ from word_with_article import word_with_article
 
 
 class MainWindow(QMainWindow):
+    # Emitted from a background thread when the lemmatizer has been loaded
+    lemmatizer_loaded = pyqtSignal()
+
     def __init__(self, start_window, data_dir, language, text_path, config, settings):
         super().__init__()
+        self.lemmatizer_loaded.connect(self.on_lemmatizer_loaded)
         self.start_window = start_window
         self.data_dir = data_dir
         self.language = language
@@ -49,15 +54,42 @@ class MainWindow(QMainWindow):
         self.config = config
         self.settings = settings
         self.styling = get_styling(self.config, settings["dark_mode"])
-        self.data = DataHandler(data_dir, language)
+        self.data = DataHandler(
+            data_dir, language, self.config.get("storage_engine", "pickle")
+        )
+        autosave_delay = self.config.get("autosave_delay", 3)
+        if autosave_delay > 0:
+            self.data.start_autosave(autosave_delay)
         self.legilo_translator = LegiloTranslator(
             language,
             use_lemma=self.config.get("use_lemmatizer"),
             lemmatizer_dir=f"{self.data_dir}/general/stanza",
             machine_translator=self.config.get("machine_translator"),
             dest_language=self.config.get("machine_translator_lang"),
+            cache_dir=f"{self.data_dir}/general",
+            wiktionary_fetch_mode=self.config.get("wiktionary_fetch_mode", "section"),
+            offline_dictionary_path=f"{self.data_dir}/general/offline_dictionary.sqlite",
+            offline_dictionary_mode=self.config.get("offline_dictionary", "auto"),
+            on_lemmatizer_loaded=self.lemmatizer_loaded.emit,
         )
         self.browser_controller = BrowserController(open_urls_in_same_tab=True)
+        # Number of upcoming new words on a page to look up in the background
+        self.num_words_to_prefetch = self.config.get("prefetch_lookups", 30)
+        # Machine translations of all prefetched words are only made in advance if
+        # enabled, since most of them are not shown when the words are in Wiktionary
+        batch_function = None
+        if self.config.get("prefetch_machine_translations", False):
+            batch_function = self.prefetch_machine_translations
+        # Lookups are prefetched by word and lemma, since the lemma found for a word
+        # depends on its context
+        self.lookup_prefetcher = LookupPrefetcher(
+            self.look_up_prefetched_word, batch_function=batch_function
+        )
+        # Runs lookups that need the network without freezing the window
+        self.async_runner = AsyncRunner()
+        # Runs the processing of the open page, e.g. finding the lemmas of its words
+        self.page_runner = AsyncRunner(max_workers=1)
+        self.text_lemmas = {}
 
         # Settings
         self.save_progress = True
@@ -176,8 +208,10 @@ class MainWindow(QMainWindow):
         # Get metadata for words, sentences and phrases in text
         self.text_words = self.get_text_words()
         self.num_text_words = len(self.text_words)
+        self.text_word_nums = self.get_text_word_nums()
         self.text_sentences = self.get_text_sentences()
         self.text_phrases = self.get_text_phrases()
+        self.text_lemmas = {}
 
         self.mark_all_words()
         self.mark_all_phrases()
@@ -194,6 +228,11 @@ class MainWindow(QMainWindow):
         if scroll_to_active:
             self.scroll_to_active_word()
 
+        if self.legilo_translator.is_lemmatizer_ready():
+            self.lemmatize_page()  # Lookups are prefetched when the lemmas are found
+        else:
+            # The page is lemmatized when the lemmatizer has been loaded
+            self.prefetch_lookups()
         self.opening_page = False
 
     def interrupt_text_field_edit(self):
@@ -228,12 +267,18 @@ class MainWindow(QMainWindow):
 
         self.handle_active()
         self.quit_and_clean_for_tts()
+        self.lookup_prefetcher.stop()
+        self.async_runner.stop()
+        self.page_runner.stop()
         if self.save_progress:
             self.data.save()
             self.save_text_with_active_word()
             print("The text was closed and your progress is saved.")
         else:
+            self.data.discard_unsaved_changes()
             print("The text was closed without saving your progress.")
+        self.data.close()
+        self.legilo_translator.close()
         if not self.edit_text_after_closing_window:
             self.start_window.show()
         else:
@@ -898,34 +943,32 @@ class MainWindow(QMainWindow):
 
         return text_words
 
+    def get_text_word_nums(self):
+        """Get the word numbers where each word occurs in the text"""
+        text_word_nums = {}
+        for word_num, word_metadata in self.text_words.items():
+            text_word_nums.setdefault(word_metadata["word"], []).append(word_num)
+        return text_word_nums
+
     def get_text_phrases(self):
         """Get metadata about the phrases in the text (start and end indices, etc.)"""
         text_phrases = []
-        phrases = self.data.phrases
-        for word_num, word_metadata in self.text_words.items():
-            word = word_metadata["word"]
-            if word in phrases:
-                phrases_for_word = phrases[word]
-                for phrase in phrases_for_word:
-                    phrase_words = phrase["phrase_words"]
-                    if self.text_word_starts_phrase(word_num, phrase_words):
-                        phrase_metadata = self.get_phrase_metadata(
-                            word_num, phrase_words
-                        )
-                        text_phrases.append(phrase_metadata)
+        words = [
+            self.text_words[word_num]["word"]
+            for word_num in range(1, self.num_text_words + 1)
+        ]
+        for start_position, phrase_words in self.data.find_phrases(words):
+            phrase_metadata = self.get_phrase_metadata(start_position + 1, phrase_words)
+            text_phrases.append(phrase_metadata)
         return text_phrases
 
     def add_to_text_phrases(self, phrase_words):
         if not self.is_in_text_phrases(phrase_words):
             first_phrase_word = phrase_words[0]
-            for word_num, word_metadata in self.text_words.items():
-                word = word_metadata["word"]
-                if word == first_phrase_word:
-                    if self.text_word_starts_phrase(word_num, phrase_words):
-                        phrase_metadata = self.get_phrase_metadata(
-                            word_num, phrase_words
-                        )
-                        self.text_phrases.append(phrase_metadata)
+            for word_num in self.text_word_nums.get(first_phrase_word, []):
+                if self.text_word_starts_phrase(word_num, phrase_words):
+                    phrase_metadata = self.get_phrase_metadata(word_num, phrase_words)
+                    self.text_phrases.append(phrase_metadata)
 
     def remove_from_text_phrases(self, phrase_words):
         self.text_phrases = [
@@ -1126,16 +1169,28 @@ class MainWindow(QMainWindow):
         phrase = self.get_part_of_text(start_idx, end_idx)
         if to_lower:
             phrase = phrase.lower()
-        info = self.legilo_translator.get_info(phrase, is_phrase=True)
-        info["word_type"] = "phrase"
         phrase_words = [
             self.get_word(word_num) for word_num in range(word_num1, word_num2 + 1)
         ]
-        info["phrase_words"] = phrase_words
+        self.async_runner.cancel()
+        self.async_runner.run(
+            self.look_up_new_phrase,
+            partial(self.add_new_phrase, word_num1, phrase_words),
+            phrase,
+        )
+
+    def look_up_new_phrase(self, phrase):
+        """Get the info for a phrase that hasn't been saved"""
+        info = self.legilo_translator.get_info(phrase, is_phrase=True)
+        info["word_type"] = "phrase"
         (sentence, sentence_trans) = get_first_sentence(phrase, self.language)
         if len(sentence) > 0:
             info["sentence"] = sentence
             info["sentence_trans"] = sentence_trans
+        return info
+
+    def add_new_phrase(self, word_num1, phrase_words, info):
+        info["phrase_words"] = phrase_words
         self.active_info = info
         self.data.add_to_phrases(info)
         self.add_to_text_phrases(phrase_words)
@@ -1156,25 +1211,132 @@ class MainWindow(QMainWindow):
             self.look_up_word()
 
     def look_up_word(self):
+        self.async_runner.cancel()
         word = self.get_active_word()
         category = self.get_category(word)
         known_without_info = category == "known" and not self.data.known_words[word]
         if category in ["new", "ignored"] or known_without_info:
-            info = self.legilo_translator.get_info(word)
-            (sentence, sentence_trans) = get_first_sentence(word, self.language)
-            if len(sentence) > 0:
-                info["sentence"] = sentence
-                info["sentence_trans"] = sentence_trans
+            self.async_runner.run(
+                self.get_new_word_info,
+                partial(self.show_looked_up_word, self.active_word_num),
+                word,
+                self.text_lemmas.get(self.active_word_num),
+            )
+            return
         elif category == "learning":
             info = self.data.learning_words[word]
         else:  # category == 'known' and word has info
             info = self.data.known_words[word]
+        self.show_looked_up_word(self.active_word_num, info)
 
+    def show_looked_up_word(self, word_num, info):
+        if word_num != self.active_word_num or self.active_phrase:
+            return
         self.active_info = info
         self.active_looked_up = True
         self.show_lookup_word()
 
+    def get_new_word_info(self, word, lemma=None):
+        """
+        Get the info for a new word, from the prefetched lookups if the word has been
+        looked up with the same lemma
+        """
+        info = self.lookup_prefetcher.get((word, lemma))
+        if not info:
+            info = self.look_up_new_word(word, lemma)
+        return info
+
+    def look_up_prefetched_word(self, word_and_lemma):
+        word, lemma = word_and_lemma
+        return self.look_up_new_word(word, lemma)
+
+    def prefetch_machine_translations(self, words_and_lemmas, contexts):
+        words = []
+        word_contexts = []
+        for (word, _), context in zip(words_and_lemmas, contexts):
+            if word not in words:
+                words.append(word)
+                word_contexts.append(context)
+        self.legilo_translator.prefetch_machine_translations(words, word_contexts)
+
+    def look_up_new_word(self, word, lemma=None):
+        """
+        Get the info for a word that hasn't been saved with info, using the lemma
+        found for it in its context if given
+        """
+        info = self.legilo_translator.get_info(word, context_lemma=lemma)
+        (sentence, sentence_trans) = get_first_sentence(word, self.language)
+        if len(sentence) > 0:
+            info["sentence"] = sentence
+            info["sentence_trans"] = sentence_trans
+        return info
+
+    def on_lemmatizer_loaded(self):
+        # Words looked up before were lemmatized with Wiktionary only
+        self.lookup_prefetcher.clear()
+        if self.page_is_open:
+            self.lemmatize_page()
+
+    def lemmatize_page(self):
+        """
+        Find the lemmas of the words on the page in their context in the background,
+        with one call of the lemmatizer for the whole page
+        """
+        if not self.legilo_translator.nlp:
+            self.prefetch_lookups()
+            return
+        self.page_runner.cancel()
+        text = self.main_text_field.toPlainText()
+        self.page_runner.run(
+            self.legilo_translator.lemmatize_text,
+            partial(self.set_text_lemmas, self.text_words, text),
+            text,
+        )
+
+    def set_text_lemmas(self, text_words, text, token_lemmas):
+        """Store the lemma of each word on the page that matches a token"""
+        if text_words is not self.text_words:  # Another page has been opened
+            return
+        tokens_by_start_idx = {
+            start_idx: (end_idx, lemma) for start_idx, end_idx, lemma in token_lemmas
+        }
+        text_lemmas = {}
+        for word_num, word_metadata in text_words.items():
+            token = tokens_by_start_idx.get(word_metadata["start_idx"])
+            if not token:
+                continue
+            token_end_idx, lemma = token
+            # Words end before apostrophes, which tokens may include (e.g. "l'")
+            if text[word_metadata["end_idx"] : token_end_idx].strip("'\u2019") == "":
+                text_lemmas[word_num] = lemma
+        self.text_lemmas = text_lemmas
+        self.prefetch_lookups()
+
+    def prefetch_lookups(self):
+        """
+        Look up the new words on the page in the background, in reading order from
+        the active word
+        """
+        if self.num_words_to_prefetch <= 0:
+            return
+        start_word_num = self.active_word_num or 1
+        word_nums = list(range(start_word_num, self.num_text_words + 1))
+        word_nums += list(range(1, start_word_num))
+        words_and_lemmas = []
+        sentences = []
+        for word_num in word_nums:
+            word = self.get_word(word_num)
+            word_and_lemma = (word, self.text_lemmas.get(word_num))
+            if self.is_new(word) and word_and_lemma not in words_and_lemmas:
+                words_and_lemmas.append(word_and_lemma)
+                text_sentence = self.text_sentences.get(word_num)
+                sentences.append(text_sentence["text"] if text_sentence else None)
+                if len(words_and_lemmas) >= self.num_words_to_prefetch:
+                    break
+        self.lookup_prefetcher.prefetch(words_and_lemmas, sentences)
+
     def look_up_phrase(self):
+        self.async_runner.cancel()
         self.clear_side_field()
         if self.active_phrase:
             self.unmark_active_word()
@@ -1465,6 +1627,8 @@ class MainWindow(QMainWindow):
             self.set_new_to_known(previous_word_num, self.num_text_words)
         self.update_last_active_word_num_with_page()
         self.active_info = None
+        # A lookup that hasn't finished is for the previous word
+        self.async_runner.cancel()
 
         self.update_num_known_words_label()
 
@@ -1716,8 +1880,9 @@ class MainWindow(QMainWindow):
                     self.lemma_text_field.insert_text(f"{lemma}")
                 first_line = False
         self.show_translation(show_lemmas=False)
-        suggestions = self.data.get_all_words(True, [self.get_active_word_or_phrase()])
-        self.lemma_text_field.set_suggestions(suggestions)
+        self.lemma_text_field.set_suggestions(
+            self.data.get_suggestion_index(), [self.get_active_word_or_phrase()]
+        )
         self.lemma_text_field.show()
         self.lemma_text_field.edit()
 
@@ -1787,14 +1952,22 @@ class MainWindow(QMainWindow):
 
         if self.has_machine_translation():
             self.delete_machine_translation()
+            self.show_translation()
         else:
-            trans_list = self.active_info["trans"]
             if self.active_phrase:
                 word = self.active_phrase["phrase_text"]
             else:
                 word = self.get_active_word()
-            machine_trans = self.legilo_translator.get_machine_translation(word)
-            trans_list += machine_trans
+            self.async_runner.run(
+                self.legilo_translator.get_machine_translation,
+                partial(self.add_machine_translation, self.active_info),
+                word,
+            )
+
+    def add_machine_translation(self, info, machine_trans):
+        if info is not self.active_info or self.has_machine_translation():
+            return
+        info["trans"] += machine_trans
         self.show_translation()
 
     def use_machine_translation(self):
@@ -1939,23 +2112,16 @@ class MainWindow(QMainWindow):
             previous_word_num -= 1
 
     def is_learning(self, word):
-        return word in self.data.learning_words.keys()
+        return self.get_category(word) == "learning"
 
     def is_known(self, word):
-        return word in self.data.known_words.keys()
+        return self.get_category(word) == "known"
 
     def is_ignored(self, word):
-        return word in self.data.ignored_words
+        return self.get_category(word) == "ignored"
 
     def get_category(self, word):
-        if self.is_learning(word):
-            return "learning"
-        elif self.is_ignored(word):
-            return "ignored"
-        elif self.is_known(word):
-            return "known"
-        else:
-            return "new"
+        return self.data.get_category(word)
 
     def get_active_word_category(self):
         word = self.get_active_word()
@@ -2048,29 +2214,48 @@ class MainWindow(QMainWindow):
             word = self.active_phrase["phrase_text"]
         else:
             word = self.get_active_word()
-        examples = self.example_sentences
-        if not examples or word != examples["word"]:
-            (sentences, sentences_trans) = get_sentences(word, self.language, 8)
-            examples = {
-                "word": word,
-                "sentences": sentences,
-                "sentences_trans": sentences_trans,
-            }
-            self.examples = examples
         if 1 <= example_num <= 8:
-            sentence = examples["sentences"][example_num - 1]
-            sentence_trans = examples["sentences_trans"][example_num - 1]
+            examples = self.example_sentences
+            if examples and word == examples["word"]:
+                self.set_example_sentence(self.active_info, example_num, examples)
+            else:
+                self.async_runner.run(
+                    self.get_example_sentences,
+                    partial(self.set_example_sentence, self.active_info, example_num),
+                    word,
+                )
         elif example_num == 9 and not self.active_phrase:
             sentence = self.get_active_sentence()
-            translator = Translator()
-            sentence_trans = translator.translate(
-                sentence, src=get_language_code(self.language), dest="en"
-            ).text
+            self.async_runner.run(
+                self.translate_sentence,
+                partial(self.set_sentence, self.active_info, sentence),
+                sentence,
+            )
         else:  # Don't use any example sentence if example_num == 0
-            sentence = ""
-            sentence_trans = ""
+            self.set_sentence(self.active_info, "", "")
+
+    def get_example_sentences(self, word):
+        (sentences, sentences_trans) = get_sentences(word, self.language, 8)
+        return {
+            "word": word,
+            "sentences": sentences,
+            "sentences_trans": sentences_trans,
+        }
 
-        info = self.active_info
+    def set_example_sentence(self, info, example_num, examples):
+        self.example_sentences = examples
+        sentence = examples["sentences"][example_num - 1]
+        sentence_trans = examples["sentences_trans"][example_num - 1]
+        self.set_sentence(info, sentence, sentence_trans)
+
+    def translate_sentence(self, sentence):
+        return self.legilo_translator.google_translate(
+            sentence, get_language_code(self.language), "en"
+        )
+
+    def set_sentence(self, info, sentence, sentence_trans):
+        if info is not self.active_info:
+            return
         info["sentence"] = sentence
         info["sentence_trans"] = sentence_trans
         self.show_example()
@@ -2173,40 +2358,59 @@ class MainWindow(QMainWindow):
                 self.last_word_translated_to_thind_lang = None
             # Otherwise, add third language translation
             else:
-                if not "remark" in self.active_info:
-                    self.active_info["remark"] = ""
-                self.remark_without_third_lang = self.active_info["remark"]
-                self.last_word_translated_to_thind_lang = word
-                third_lang = self.config["third_language"]
-                third_lang_trans = f"{third_lang.capitalize()} translations:\n"
-                third_lang_trans += self.translate_to_third_lang(word, trans)
-                new_remark = self.active_info["remark"]
-                if len(self.active_info["remark"]) > 0:
-                    new_remark += "\n\n"
-                new_remark += third_lang_trans
-                self.active_info["remark"] = new_remark
+                definitions = self.definitions_to_list(trans)
+                self.async_runner.run(
+                    self.translate_to_third_lang,
+                    partial(self.add_third_lang_remark, self.active_info, word),
+                    word,
+                    definitions,
+                )
+                return
             self.show_remark()
 
-    def translate_to_third_lang(self, word, trans):
-        translator = Translator()
+    def add_third_lang_remark(self, info, word, translations):
+        if info is not self.active_info:
+            return
+        if word == self.last_word_translated_to_thind_lang:  # Already added
+            return
+        if not "remark" in info:
+            info["remark"] = ""
+        self.remark_without_third_lang = info["remark"]
+        self.last_word_translated_to_thind_lang = word
+        third_lang = self.config["third_language"]
+        third_lang_trans = f"{third_lang.capitalize()} translations:\n"
+        third_lang_trans += translations
+        new_remark = info["remark"]
+        if len(info["remark"]) > 0:
+            new_remark += "\n\n"
+        new_remark += third_lang_trans
+        info["remark"] = new_remark
+        self.show_remark()
+
+    def translate_to_third_lang(self, word, definitions):
+        """
+        Translate word and its English definitions to the third language, with one
+        request for all definitions
+        """
+        translator = self.legilo_translator
+        third_lang_code = get_language_code(self.config["third_language"])
         translations = []
 
-        # Translate the original word directly to third_lang
-        third_lang_trans = translator.translate(
+        # Translate the original word directly to third_lang, while the definitions
+        # are translated
+        word_future = translator.executor.submit(
+            translator.google_translate,
             word,
-            src=get_language_code(self.language),
-            dest=get_language_code(self.config["third_language"]),
-        ).text
-        translations.append(word + " = " + third_lang_trans)
+            get_language_code(self.language),
+            third_lang_code,
+        )
 
         # Translate the English translations to third_lang
-        definitions = self.definitions_to_list(trans)
-        for definition in definitions:
-            third_lang_trans = translator.translate(
-                definition,
-                src="en",
-                dest=get_language_code(self.config["third_language"]),
-            ).text
+        definitions_trans = translator.google_translate_batch(
+            definitions, "en", third_lang_code
+        )
+        translations.append(word + " = " + word_future.result())
+        for definition, third_lang_trans in zip(definitions, definitions_trans):
             translations.append(definition + " = " + third_lang_trans)
 
         if len(translations) == 0:
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Offline dictionary built from a Wiktionary extract in the JSON Lines format of
+wiktextract (e.g. from https://kaikki.org), stored as an indexed SQLite file.
+
+Usage:
+    python offline_dictionary.py <extract.jsonl[.gz]> [--languages french german]
+        [--data-dir data]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import pickle
+import re
+import sqlite3
+import threading
+
+from remove_pronunciation_accents import remove_pronunciation_accents
+
+# Part of speech names used by wiktextract, and the corresponding Wiktionary headings
+PARTS_OF_SPEECH = {
+    "adj": "adjective",
+    "adv": "adverb",
+    "article": "article",
+    "character": "character",
+    "conj": "conjunction",
+    "det": "determiner",
+    "idiom": "idiom",
+    "intj": "interjection",
+    "letter": "letter",
+    "name": "proper noun",
+    "noun": "noun",
+    "num": "numeral",
+    "phrase": "phrase",
+    "prep": "preposition",
+    "pron": "pronoun",
+    "proverb": "proverb",
+    "symbol": "symbol",
+    "syllable": "syllable",
+    "verb": "verb",
+}
+
+GENDER_TAGS = {"masculine": "m", "feminine": "f", "neuter": "n", "common": "c"}
+
+# Number of entries to insert per transaction when importing
+IMPORT_BATCH_SIZE = 1000
+
+
+def get_default_path(data_dir):
+    return data_dir + "/general/offline_dictionary.sqlite"
+
+
+class OfflineDictionary:
+    """
+    Dictionary with Wiktionary entries for looking up words without network access.
+    The entries have the same format as the results parsed from Wiktionary pages.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        # Lookups may be made from several threads, one at a time
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    language TEXT NOT NULL,
+                    word TEXT NOT NULL,
+                    result BLOB NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS entries_word ON entries (language, word);
+                CREATE TABLE IF NOT EXISTS languages (
+                    language TEXT PRIMARY KEY
+                );
+                """
+            )
+
+    def has_language(self, language):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT 1 FROM languages WHERE language = ?", (language,)
+            ).fetchone()
+        return row is not None
+
+    def lookup(self, language, word):
+        """
+        Get the results and lemmas for word, in the same format as
+        LegiloTranslator.parse_from_wiktionary
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT result FROM entries WHERE language = ? AND word = ? "
+                + "ORDER BY rowid",
+                (language, word),
+            ).fetchall()
+        results = [pickle.loads(row[0]) for row in rows]
+        # Each part of speech of an etymology has the etymology text. As on the
+        # Wiktionary pages, it is only kept on the first one.
+        etymologies = set()
+        for result in results:
+            if "etymology" in result:
+                if result["etymology"] in etymologies:
+                    del result["etymology"]
+                else:
+                    etymologies.add(result["etymology"])
+        lemmas = {result["lemma"] for result in results if "lemma" in result}
+        return results, lemmas
+
+    def import_extract(self, path, languages=None):
+        """
+        Import the entries of a wiktextract JSON Lines file, optionally only for the
+        given languages (e.g. "French"). Entries already imported for a language are
+        replaced.
+        """
+        if path.endswith(".gz"):
+            f = gzip.open(path, "rt", encoding="utf-8")
+        else:
+            f = open(path, "r", encoding="utf-8")
+        num_entries = 0
+        imported_languages = set()
+        batch = []
+        with f:
+            for line_num, line in enumerate(f, start=1):
+                try:
+                    entry = json.loads(line)
+                except ValueError as e:
+                    print(f"Skipped invalid entry on line {line_num}: {e}")
+                    continue
+                language = entry.get("lang")
+                if not language or (languages and language not in languages):
+                    continue
+                if language not in imported_languages:
+                    self.remove_language(language)
+                    imported_languages.add(language)
+                result = convert_entry(entry)
+                if not result:
+                    continue
+                word = remove_pronunciation_accents(language, entry["word"])
+                batch.append(
+                    (language, word, pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+                )
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    self.insert_entries(batch)
+                    num_entries += len(batch)
+                    batch = []
+        self.insert_entries(batch)
+        num_entries += len(batch)
+        with self.lock:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO languages (language) VALUES (?)",
+                    [(language,) for language in imported_languages],
+                )
+        return num_entries
+
+    def insert_entries(self, entries):
+        with self.lock:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT INTO entries (language, word, result) VALUES (?, ?, ?)",
+                    entries,
+                )
+
+    def remove_language(self, language):
+        with self.lock:
+            with self.connection:
+                self.connection.execute(
+                    "DELETE FROM entries WHERE language = ?", (language,)
+                )
+                self.connection.execute(
+                    "DELETE FROM languages WHERE language = ?", (language,)
+                )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def convert_entry(entry):
+    """
+    Convert a wiktextract entry (one part of speech of a word) to the result format
+    used for Wiktionary pages
+    """
+    definitions = []
+    lemma = None
+    for sense in entry.get("senses", []):
+        glosses = sense.get("raw_glosses") or sense.get("glosses")
+        if not glosses:
+            continue
+        definition = {"definition": glosses[-1]}
+        synonyms = [
+            item["word"] for item in sense.get("synonyms", []) if "word" in item
+        ]
+        if synonyms:
+            definition["synonyms"] = ", ".join(synonyms)
+        antonyms = [
+            item["word"] for item in sense.get("antonyms", []) if "word" in item
+        ]
+        if antonyms:
+            definition["antonyms"] = ", ".join(antonyms)
+        definitions.append(definition)
+        for form_of in sense.get("form_of", []) + sense.get("alt_of", []):
+            if "word" in form_of:
+                lemma = remove_pronunciation_accents(entry["lang"], form_of["word"])
+    if not definitions:
+        return None
+
+    pos = entry.get("pos", "")
+    result = {
+        "part_of_speech": PARTS_OF_SPEECH.get(pos, pos),
+        "definitions": definitions,
+        "source": "Wiktionary",
+        "word": remove_pronunciation_accents(entry["lang"], entry["word"]),
+    }
+    if entry.get("etymology_text"):
+        result["etymology"] = entry["etymology_text"]
+    head_templates = entry.get("head_templates", [])
+    if head_templates and "expansion" in head_templates[0]:
+        match = re.search(r"\((.*?)\)", head_templates[0]["expansion"])
+        if match:
+            result["word_info"] = match.group(1)
+    genders = [GENDER_TAGS[tag] for tag in entry.get("tags", []) if tag in GENDER_TAGS]
+    if genders:
+        result["gender"] = " or ".join(genders)
+    if lemma:
+        result["lemma"] = lemma
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Import a wiktextract JSON Lines file as offline dictionary"
+    )
+    parser.add_argument("file")
+    parser.add_argument(
+        "--languages",
+        nargs="*",
+        help="languages to import, e.g. french german (default: all in the file)",
+    )
+    parser.add_argument("--data-dir", default="data")
+    args = parser.parse_args()
+
+    languages = None
+    if args.languages:
+        languages = set()
+        for language in args.languages:
+            language = language.capitalize()
+            if language == "Croatian":
+                language = "Serbo-Croatian"  # Used in Wiktionary
+            languages.add(language)
+    dictionary = OfflineDictionary(get_default_path(args.data_dir))
+    try:
+        num_entries = dictionary.import_extract(args.file, languages)
+        print(f"Imported {num_entries} entries to {dictionary.path}")
+    finally:
+        dictionary.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import mmap
+import os
+import pickle
+from collections.abc import MutableMapping
+
+from trans_items import join_trans_items, split_trans_items
+
+
+class PayloadRef:
+    """
+    Position of a pickled payload in a payload file, and the keys of the translation
+    items it refers to
+    """
+
+    __slots__ = ("offset", "length", "item_keys")
+
+    def __init__(self, offset, length, item_keys=None):
+        self.offset = offset
+        self.length = length
+        self.item_keys = item_keys
+
+
+class PayloadFile:
+    """Read-only, memory-mapped file with pickled payloads stored back to back"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.map = None
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self.file = open(path, "rb")
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read_raw(self, ref):
+        return self.map[ref.offset : ref.offset + ref.length]
+
+    def read(self, ref):
+        return pickle.loads(self.read_raw(ref))
+
+    def close(self):
+        if self.map:
+            self.map.close()
+            self.map = None
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+class LazyInfoDict(MutableMapping):
+    """
+    Dictionary mapping word to info, where the infos are kept in a payload file and
+    only decoded when they are accessed. The keys are always in memory, so that
+    membership tests and iteration over words don't touch the payloads.
+    Translation items are stored once per distinct content in the same payload file,
+    and the infos refer to them by key.
+    """
+
+    def __init__(self, entries=None, payload_file=None, trans_items=None):
+        # Maps word to either a PayloadRef or the decoded info
+        self.entries = entries if entries is not None else {}
+        # Maps item key to either a PayloadRef or the pickled item
+        self.trans_items = trans_items if trans_items is not None else {}
+        self.payload_file = payload_file
+
+    def __getitem__(self, word):
+        value = self.entries[word]
+        if isinstance(value, PayloadRef):
+            value = join_trans_items(self.payload_file.read(value), self.get_item)
+            self.entries[word] = value
+        return value
+
+    def __setitem__(self, word, info):
+        self.entries[word] = info
+
+    def __delitem__(self, word):
+        del self.entries[word]
+
+    def __contains__(self, word):
+        return word in self.entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def read(self, word):
+        """Get the info for word, without keeping it decoded in memory"""
+        value = self.entries[word]
+        if isinstance(value, PayloadRef):
+            return join_trans_items(self.payload_file.read(value), self.get_item)
+        return value
+
+    def get_item(self, key):
+        """Get a new copy of the translation item with key"""
+        return pickle.loads(self.get_raw_item(key))
+
+    def get_raw_item(self, key):
+        value = self.trans_items[key]
+        if isinstance(value, PayloadRef):
+            return self.payload_file.read_raw(value)
+        return value
+
+    def get_raw(self, word):
+        """
+        Get the pickled info for word, without decoding it if it isn't already,
+        together with the keys of the translation items it refers to
+        """
+        value = self.entries[word]
+        if isinstance(value, tuple):
+            return value  # Pickled when the snapshot was taken
+        if isinstance(value, PayloadRef):
+            if value.item_keys is not None:
+                return self.payload_file.read_raw(value), value.item_keys
+            # Stored before translation items were shared
+            value = self.payload_file.read(value)
+        if value is None:
+            return None, ()
+        stored_info, items = split_trans_items(value)
+        for key, raw_item in items:
+            if key not in self.trans_items:
+                self.trans_items[key] = raw_item
+        item_keys = tuple(key for key, _ in items)
+        return pickle.dumps(stored_info, pickle.HIGHEST_PROTOCOL), item_keys
+
+    def snapshot(self):
+        """
+        Get a copy that can be written in another thread while this dict changes.
+        The decoded infos are pickled right away, since they may be changed in place.
+        """
+        entries = {}
+        for word, value in self.entries.items():
+            if value is None or isinstance(value, PayloadRef):
+                entries[word] = value
+            else:
+                entries[word] = self.get_raw(word)
+        return LazyInfoDict(entries, self.payload_file, dict(self.trans_items))
+
+    def write(self, path):
+        """
+        Write all infos, and the translation items they refer to, to a new payload
+        file at `path`. Returns the index, mapping word to (offset, length, item
+        keys), or None for words without info, and the item index, mapping item key
+        to (offset, length).
+        """
+        index = {}
+        item_index = {}
+        with open(path, "wb") as f:
+            offset = 0
+            for word in self.entries:
+                raw, item_keys = self.get_raw(word)
+                if raw is None:
+                    index[word] = None
+                    continue
+                f.write(raw)
+                index[word] = (offset, len(raw), item_keys)
+                offset += len(raw)
+                for key in item_keys:
+                    if key not in item_index:
+                        item_index[key] = None  # Written after the infos
+            # Items no longer referred to by any info are left out
+            for key in item_index:
+                raw = self.get_raw_item(key)
+                f.write(raw)
+                item_index[key] = (offset, len(raw))
+                offset += len(raw)
+            f.flush()
+            os.fsync(f.fileno())
+        return index, item_index
+
+    def switch_to(self, path, index, item_index, snapshot):
+        """
+        Switch to reading from the payload file that `snapshot` was written to, with
+        the indices returned by write. Infos changed after the snapshot was taken are
+        already decoded, and infos still in the old payload file are in the snapshot.
+        """
+        for word, value in self.entries.items():
+            if isinstance(value, PayloadRef) and snapshot.entries.get(word) is value:
+                self.entries[word] = PayloadRef(*index[word])
+        for key, value in list(self.trans_items.items()):
+            if not isinstance(value, PayloadRef):
+                continue
+            if key in item_index:
+                self.trans_items[key] = PayloadRef(*item_index[key])
+            else:
+                # Not referred to by any info that is still in a payload file
+                del self.trans_items[key]
+        if self.payload_file:
+            self.payload_file.close()
+        self.payload_file = PayloadFile(path)
+
+    def close(self):
+        if self.payload_file:
+            self.payload_file.close()
+
+
+def lazy_info_dict_from_index(index, payload_path, item_index=None):
+    """Create a LazyInfoDict from the indices written by LazyInfoDict.write"""
+    items = {}
+    shared_keys = {}
+    for key, position in (item_index or {}).items():
+        items[key] = PayloadRef(*position)
+        shared_keys[key] = key
+    entries = {}
+    for word, position in index.items():
+        if position is None:
+            entries[word] = None
+        elif len(position) == 2:
+            # Written before translation items were shared
+            entries[word] = PayloadRef(*position)
+        else:
+            offset, length, item_keys = position
+            # Share one key object per item between all the words referring to it
+            item_keys = tuple(shared_keys.get(key, key) for key in item_keys)
+            entries[word] = PayloadRef(offset, length, item_keys)
+    return LazyInfoDict(entries, PayloadFile(payload_path), items)
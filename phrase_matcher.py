@@ -0,0 +1,97 @@
+class PhraseMatcher:
+    """
+    Aho-Corasick automaton over phrases given as sequences of words. All saved phrases
+    occurring in a text are found in one pass over the words of the text, regardless
+    of how many phrases share the same first word.
+    """
+
+    def __init__(self, phrases=()):
+        # Trie of phrase words, where each node is an index into the lists below
+        self.children = [{}]
+        self.depth = [0]
+        self.phrase = [None]  # Phrase ending at the node, as a tuple of words
+        self.fail = [0]
+        self.links_outdated = False
+        for phrase_words in phrases:
+            self.add(phrase_words)
+
+    def add(self, phrase_words):
+        """Add phrase, given as a list of words"""
+        if not phrase_words:
+            return
+        node = 0
+        for word in phrase_words:
+            child = self.children[node].get(word)
+            if child is None:
+                child = len(self.children)
+                self.children[node][word] = child
+                self.children.append({})
+                self.depth.append(self.depth[node] + 1)
+                self.phrase.append(None)
+                self.fail.append(0)
+                self.links_outdated = True  # Rebuilt on the next search
+            node = child
+        self.phrase[node] = tuple(phrase_words)
+
+    def remove(self, phrase_words):
+        """
+        Remove phrase. The trie nodes are kept, so that the failure links stay valid,
+        but the phrase is no longer reported as a match.
+        """
+        node = self.get_node(phrase_words)
+        if node is not None:
+            self.phrase[node] = None
+
+    def __contains__(self, phrase_words):
+        node = self.get_node(phrase_words)
+        return node is not None and self.phrase[node] is not None
+
+    def get_node(self, phrase_words):
+        node = 0
+        for word in phrase_words:
+            node = self.children[node].get(word)
+            if node is None:
+                return None
+        return node
+
+    def build_links(self):
+        """Compute the failure links in breadth-first order"""
+        queue = list(self.children[0].values())
+        for node in queue:
+            self.fail[node] = 0
+        i = 0
+        while i < len(queue):
+            node = queue[i]
+            i += 1
+            for word, child in self.children[node].items():
+                fallback = self.fail[node]
+                while fallback and word not in self.children[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.children[fallback].get(word, 0)
+                queue.append(child)
+        self.links_outdated = False
+
+    def find(self, words):
+        """
+        Find all occurrences of the phrases in a sequence of words. Returns a list of
+        (start_position, phrase_words) tuples, ordered by start position.
+        """
+        if self.links_outdated:
+            self.build_links()
+        matches = []
+        node = 0
+        for position, word in enumerate(words):
+            while node and word not in self.children[node]:
+                node = self.fail[node]
+            node = self.children[node].get(word, 0)
+            # Phrases ending here are the node and its suffixes along the failure
+            # links, which are at most as many as the words in the longest phrase
+            match_node = node
+            while match_node:
+                phrase = self.phrase[match_node]
+                if phrase is not None:
+                    start_position = position - self.depth[match_node] + 1
+                    matches.append((start_position, phrase))
+                match_node = self.fail[match_node]
+        matches.sort(key=lambda match: match[0])
+        return matches
@@ -0,0 +1,52 @@
+from bisect import bisect_left, insort
+
+
+class PrefixIndex:
+    """
+    Sorted index of suggestions, each belonging to a key (e.g. a word), where the
+    suggestions starting with a prefix are found by binary search
+    """
+
+    def __init__(self, suggestions=None):
+        # Maps key to suggestion
+        self.suggestions = dict(suggestions) if suggestions else {}
+        # Sorted list of (suggestion, key) tuples
+        self.entries = sorted(
+            (suggestion, key) for key, suggestion in self.suggestions.items()
+        )
+
+    def set(self, key, suggestion):
+        """Set the suggestion for key, replacing any previous one"""
+        if self.suggestions.get(key) == suggestion:
+            return
+        self.remove(key)
+        self.suggestions[key] = suggestion
+        insort(self.entries, (suggestion, key))
+
+    def remove(self, key):
+        if key not in self.suggestions:
+            return
+        entry = (self.suggestions.pop(key), key)
+        i = bisect_left(self.entries, entry)
+        del self.entries[i]
+
+    def __contains__(self, key):
+        return key in self.suggestions
+
+    def __len__(self):
+        return len(self.entries)
+
+    def find(self, prefix, exclude_keys=()):
+        """
+        Get the first suggestion in sorted order that starts with prefix and doesn't
+        belong to any of the excluded keys, or None if there is no such suggestion
+        """
+        i = bisect_left(self.entries, (prefix,))
+        while i < len(self.entries):
+            suggestion, key = self.entries[i]
+            if not suggestion.startswith(prefix):
+                break
+            if key not in exclude_keys:
+                return suggestion
+            i += 1
+        return None
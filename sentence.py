@@ -1,19 +1,11 @@
-import os
-import ssl
-import urllib
-from urllib.error import URLError, HTTPError
-from urllib.request import Request
+import urllib.parse
 
 import requests
 from bs4 import BeautifulSoup
 
+import http_client
 from language_code import get_language_code
 
-if not os.environ.get("PYTHONHTTPSVERIFY", "") and getattr(
-    ssl, "_create_unverified_context", None
-):
-    ssl._create_default_https_context = ssl._create_unverified_context
-
 
 def get_sentences(word, language, n):
     """Return n example sentences"""
@@ -33,17 +25,19 @@ def get_sentences(word, language, n):
                 link,
                 safe="/:",
             )
-            link = Request(link, headers={"User-Agent": "Mozilla/5.0"})
-
-            with urllib.request.urlopen(link, timeout=10) as url:
-                raw_html = url.read()
-
-            html = BeautifulSoup(raw_html, "html.parser")
-
-        except HTTPError as http_err:
-            print(f"HTTP error occurred: {http_err.code} - {http_err.reason}")
-        except URLError as url_err:
-            print(f"URL error occurred: {url_err.reason}")
+            response = http_client.get(link)
+            response.raise_for_status()
+
+            html = BeautifulSoup(response.content, "html.parser")
+
+        except requests.exceptions.HTTPError as http_err:
+            print(f"HTTP error occurred: {http_err}")
+        except requests.exceptions.ConnectionError as conn_err:
+            print(f"Connection error occurred: {conn_err}")
+        except requests.exceptions.Timeout as timeout_err:
+            print(f"Timeout error occurred: {timeout_err}")
+        except requests.exceptions.RequestException as req_err:
+            print(f"An error occurred: {req_err}")
         except Exception as general_err:
             print(f"An unexpected error occurred: {general_err}")
 
@@ -77,7 +71,7 @@ def get_from_glosbe(word, language, n):
 
     response = None
     try:
-        response = requests.get(url, timeout=10)
+        response = http_client.get(url)
     except requests.exceptions.HTTPError as http_err:
         print(f"HTTP error occurred: {http_err}")
     except requests.exceptions.ConnectionError as conn_err:
@@ -0,0 +1,81 @@
+import copy
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key, so that only the first one runs
+    and the others wait for it and get the same result. Each caller gets its own
+    copy of the result when it is shared, since callers may change it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Maps key to the future and the number of waiters of the running call
+        self.calls = {}
+
+    def do(self, key, function, *args):
+        """Call function(*args), or wait for a running call with the same key"""
+        with self.lock:
+            call = self.calls.get(key)
+            if call:
+                call[1] += 1
+            else:
+                future = Future()
+                self.calls[key] = [future, 0]
+        if call:
+            return copy.deepcopy(call[0].result())
+
+        try:
+            result = function(*args)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self.lock:
+                num_waiters = self.calls.pop(key)[1]
+        if num_waiters > 0:
+            # The result in the future is copied by the waiters, so it must not change
+            return copy.deepcopy(result)
+        return result
+
+    def do_batch(self, keys, function, items):
+        """
+        Call function with the items whose keys have no running call, where function
+        takes a list of items and returns a list of their results in the same order.
+        Returns the results for all items, waiting for the running calls of the rest.
+        """
+        futures = []
+        run_indices = []
+        with self.lock:
+            for i, key in enumerate(keys):
+                call = self.calls.get(key)
+                if call:
+                    call[1] += 1
+                else:
+                    call = [Future(), 0]
+                    self.calls[key] = call
+                    run_indices.append(i)
+                futures.append(call[0])
+
+        results = [None] * len(keys)
+        if run_indices:
+            try:
+                run_results = function([items[i] for i in run_indices])
+            except BaseException as e:
+                for i in run_indices:
+                    futures[i].set_exception(e)
+                raise
+            finally:
+                with self.lock:
+                    num_waiters = [self.calls.pop(keys[i])[1] for i in run_indices]
+            for i, result, waiters in zip(run_indices, run_results, num_waiters):
+                futures[i].set_result(result)
+                results[i] = copy.deepcopy(result) if waiters > 0 else result
+        for i, future in enumerate(futures):
+            if results[i] is None:
+                results[i] = copy.deepcopy(future.result())
+        return results
@@ -0,0 +1,321 @@
+import os
+import pickle
+import sqlite3
+from collections.abc import Mapping, MutableMapping
+
+from trans_items import get_trans_item_keys, join_trans_items, split_trans_items
+
+
+class SQLiteStore:
+    """
+    Vocabulary storage in an indexed SQLite file. Rows are read on demand and every
+    mutation is committed as a small transaction, instead of loading and saving the
+    full word lists.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.create_tables()
+
+    def create_tables(self):
+        with self.connection:
+            self.connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS words (
+                    word TEXT PRIMARY KEY,
+                    category TEXT NOT NULL,
+                    info BLOB
+                );
+                CREATE INDEX IF NOT EXISTS words_category ON words (category);
+                CREATE TABLE IF NOT EXISTS trans_items (
+                    key BLOB PRIMARY KEY,
+                    item BLOB NOT NULL,
+                    refcount INTEGER NOT NULL
+                );
+                -- Lemmas were stored in a table of their own by earlier versions
+                DROP TABLE IF EXISTS lemmas;
+                CREATE TABLE IF NOT EXISTS personal_translations (
+                    word TEXT PRIMARY KEY,
+                    translation TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS phrases (
+                    phrase TEXT PRIMARY KEY,
+                    first_word TEXT NOT NULL,
+                    info BLOB
+                );
+                CREATE INDEX IF NOT EXISTS phrases_first_word ON phrases (first_word);
+                CREATE TABLE IF NOT EXISTS metadata (
+                    key TEXT PRIMARY KEY,
+                    value BLOB
+                );
+                """
+            )
+
+    def execute(self, sql, parameters=()):
+        return self.connection.execute(sql, parameters)
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def get_trans_item(self, key):
+        row = self.execute("SELECT item FROM trans_items WHERE key = ?", (key,))
+        return decode(row.fetchone()[0])
+
+    def acquire_trans_items(self, items):
+        """Store translation items, or count one more reference to stored ones"""
+        self.connection.executemany(
+            "INSERT INTO trans_items (key, item, refcount) VALUES (?, ?, 1) "
+            + "ON CONFLICT (key) DO UPDATE SET refcount = refcount + 1",
+            items,
+        )
+
+    def release_trans_items(self, keys):
+        """Count one reference less to translation items, and remove unused ones"""
+        self.connection.executemany(
+            "UPDATE trans_items SET refcount = refcount - 1 WHERE key = ?",
+            [(key,) for key in keys],
+        )
+        self.connection.executemany(
+            "DELETE FROM trans_items WHERE key = ? AND refcount <= 0",
+            [(key,) for key in keys],
+        )
+
+    def get_metadata(self, key, default=None):
+        row = self.execute("SELECT value FROM metadata WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return default
+        return decode(row[0])
+
+    def set_metadata(self, key, value):
+        self.execute(
+            "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
+            (key, encode(value)),
+        )
+
+    def is_migrated(self):
+        return self.get_metadata("migrated_from_pickle", False)
+
+    def import_data(
+        self, known_words, learning_words, ignored_words, personal_translations, phrases
+    ):
+        """One-shot import of the word lists previously stored as pickle files"""
+        with self.connection:
+            known = SQLiteWords(self, "known")
+            learning = SQLiteWords(self, "learning")
+            ignored = SQLiteWords(self, "ignored")
+            translations = SQLiteTranslations(self)
+            phrase_store = SQLitePhrases(self)
+            for word, info in known_words.items():
+                known[word] = info
+            for word in ignored_words:
+                ignored[word] = None
+            # Learning words are imported last, since they have precedence if a word
+            # is found in several lists
+            for word, info in learning_words.items():
+                learning[word] = info
+            for word, translation in personal_translations.items():
+                translations[word] = translation
+            for first_word, phrase_infos in phrases.items():
+                phrase_store[first_word] = phrase_infos
+            self.set_metadata("migrated_from_pickle", True)
+
+
+class SQLiteWords(MutableMapping):
+    """
+    Dictionary-like view of the words in one category, mapping word to info. The
+    translation items of the infos are stored once per distinct content in the
+    trans_items table.
+    """
+
+    def __init__(self, store, category):
+        self.store = store
+        self.category = category
+
+    def __getitem__(self, word):
+        row = self.store.execute(
+            "SELECT info FROM words WHERE word = ? AND category = ?",
+            (word, self.category),
+        ).fetchone()
+        if row is None:
+            raise KeyError(word)
+        return join_trans_items(decode(row[0]), self.store.get_trans_item)
+
+    def __setitem__(self, word, info):
+        self.release_trans_items(word)
+        stored_info, items = split_trans_items(info)
+        self.store.acquire_trans_items(items)
+        self.store.execute(
+            "INSERT OR REPLACE INTO words (word, category, info) VALUES (?, ?, ?)",
+            (word, self.category, encode(stored_info)),
+        )
+
+    def __delitem__(self, word):
+        if word not in self:
+            raise KeyError(word)
+        self.release_trans_items(word)
+        self.store.execute(
+            "DELETE FROM words WHERE word = ? AND category = ?", (word, self.category)
+        )
+
+    def release_trans_items(self, word):
+        """Release the translation items of the stored info for word, if any"""
+        row = self.store.execute(
+            "SELECT info FROM words WHERE word = ?", (word,)
+        ).fetchone()
+        if row is not None:
+            self.store.release_trans_items(get_trans_item_keys(decode(row[0])))
+
+    def __contains__(self, word):
+        row = self.store.execute(
+            "SELECT 1 FROM words WHERE word = ? AND category = ?",
+            (word, self.category),
+        ).fetchone()
+        return row is not None
+
+    def __iter__(self):
+        rows = self.store.execute(
+            "SELECT word FROM words WHERE category = ?", (self.category,)
+        )
+        for row in rows.fetchall():
+            yield row[0]
+
+    def __len__(self):
+        row = self.store.execute(
+            "SELECT COUNT(*) FROM words WHERE category = ?", (self.category,)
+        ).fetchone()
+        return row[0]
+
+
+class SQLiteWordStatus(Mapping):
+    """Read-only view of the words table, mapping word to category"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, word):
+        row = self.store.execute(
+            "SELECT category FROM words WHERE word = ?", (word,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(word)
+        return row[0]
+
+    def __iter__(self):
+        rows = self.store.execute("SELECT word FROM words")
+        for row in rows.fetchall():
+            yield row[0]
+
+    def __len__(self):
+        return self.store.execute("SELECT COUNT(*) FROM words").fetchone()[0]
+
+
+class SQLiteTranslations(MutableMapping):
+    """Dictionary-like view of the personal translations, mapping word to translation"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, word):
+        row = self.store.execute(
+            "SELECT translation FROM personal_translations WHERE word = ?", (word,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(word)
+        return row[0]
+
+    def __setitem__(self, word, translation):
+        self.store.execute(
+            "INSERT OR REPLACE INTO personal_translations (word, translation) "
+            + "VALUES (?, ?)",
+            (word, translation),
+        )
+
+    def __delitem__(self, word):
+        cursor = self.store.execute(
+            "DELETE FROM personal_translations WHERE word = ?", (word,)
+        )
+        if cursor.rowcount == 0:
+            raise KeyError(word)
+
+    def __contains__(self, word):
+        row = self.store.execute(
+            "SELECT 1 FROM personal_translations WHERE word = ?", (word,)
+        ).fetchone()
+        return row is not None
+
+    def __iter__(self):
+        rows = self.store.execute("SELECT word FROM personal_translations")
+        for row in rows.fetchall():
+            yield row[0]
+
+    def __len__(self):
+        row = self.store.execute("SELECT COUNT(*) FROM personal_translations")
+        return row.fetchone()[0]
+
+
+class SQLitePhrases(MutableMapping):
+    """Dictionary-like view of the phrases, mapping first word to a list of infos"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, first_word):
+        rows = self.store.execute(
+            "SELECT info FROM phrases WHERE first_word = ? ORDER BY rowid",
+            (first_word,),
+        ).fetchall()
+        if not rows:
+            raise KeyError(first_word)
+        return [decode(row[0]) for row in rows]
+
+    def __setitem__(self, first_word, phrase_infos):
+        self.store.execute("DELETE FROM phrases WHERE first_word = ?", (first_word,))
+        self.store.connection.executemany(
+            "INSERT OR REPLACE INTO phrases (phrase, first_word, info) VALUES (?, ?, ?)",
+            [
+                (" ".join(info["phrase_words"]), first_word, encode(info))
+                for info in phrase_infos
+            ],
+        )
+
+    def __delitem__(self, first_word):
+        cursor = self.store.execute(
+            "DELETE FROM phrases WHERE first_word = ?", (first_word,)
+        )
+        if cursor.rowcount == 0:
+            raise KeyError(first_word)
+
+    def __contains__(self, first_word):
+        row = self.store.execute(
+            "SELECT 1 FROM phrases WHERE first_word = ?", (first_word,)
+        ).fetchone()
+        return row is not None
+
+    def __iter__(self):
+        rows = self.store.execute("SELECT DISTINCT first_word FROM phrases")
+        for row in rows.fetchall():
+            yield row[0]
+
+    def __len__(self):
+        row = self.store.execute("SELECT COUNT(DISTINCT first_word) FROM phrases")
+        return row.fetchone()[0]
+
+
+def encode(obj):
+    return pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+
+
+def decode(data):
+    if data is None:
+        return None
+    return pickle.loads(data)
@@ -0,0 +1,45 @@
+import hashlib
+import pickle
+
+# Marks a stored info where the translation items are replaced by content keys
+INTERNED_TRANS = "interned_trans"
+
+
+def split_trans_items(info):
+    """
+    Replace the translation items in info by keys computed from their content, so
+    that identical items (e.g. the entry of a lemma shared by several inflected
+    forms) can be stored once. Returns the info to store and a list of
+    (key, pickled item) pairs.
+    """
+    if not isinstance(info, dict) or not isinstance(info.get("trans"), list):
+        return info, []
+    items = []
+    for item in info["trans"]:
+        raw = pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+        items.append((hashlib.sha1(raw).digest(), raw))
+    stored_info = {**info, "trans": [key for key, _ in items]}
+    return (INTERNED_TRANS, stored_info), items
+
+
+def join_trans_items(stored_info, get_item):
+    """Restore an info stored by split_trans_items, using get_item(key) for items"""
+    if not is_interned(stored_info):
+        return stored_info
+    info = stored_info[1]
+    info["trans"] = [get_item(key) for key in info["trans"]]
+    return info
+
+
+def get_trans_item_keys(stored_info):
+    if not is_interned(stored_info):
+        return []
+    return stored_info[1]["trans"]
+
+
+def is_interned(stored_info):
+    return (
+        isinstance(stored_info, tuple)
+        and len(stored_info) == 2
+        and stored_info[0] == INTERNED_TRANS
+    )
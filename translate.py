@@ -1,16 +1,26 @@
+import json
 import os
 import re
+import threading
 import unicodedata
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
 
 import requests
 import stanza
 from bs4 import BeautifulSoup
 from googletrans import Translator
 
+import http_client
+from disk_cache import DiskCache
 from gpt_translator import GPTTranslator
+from http_cache import HTTPCache
 from language_code import get_language_code
+from machine_translation_cache import MachineTranslationCache
+from offline_dictionary import OfflineDictionary
 from remove_pronunciation_accents import remove_pronunciation_accents
+from single_flight import SingleFlight
 
 
 # Ignore warnings from and related to stanza
@@ -63,6 +73,23 @@ PARTS_OF_SPEECH = [
     "pronoun",
 ]
 
+# Increase when the parsing of Wiktionary pages is changed, so that results parsed by
+# earlier versions are not used from the cache
+WIKTIONARY_PARSER_VERSION = 1
+
+# Time in seconds for which parsed Wiktionary results are used without fetching the
+# page again
+WIKTIONARY_CACHE_TTL = 7 * 24 * 60 * 60
+
+# Time in seconds for which words without Wiktionary results for the language are
+# not looked up again. Shorter than for found words, since pages are added over time.
+WIKTIONARY_MISSING_TTL = 24 * 60 * 60
+
+# Google Translate has no model or prompt to choose, so their parts of the keys of
+# cached translations are fixed
+GOOGLE_TRANSLATE_MODEL = "googletrans"
+GOOGLE_TRANSLATE_PROMPT_VERSION = 0
+
 
 class LegiloTranslator:
     def __init__(
@@ -72,45 +99,138 @@ class LegiloTranslator:
         lemmatizer_dir=None,
         machine_translator=None,
         dest_language="English",
+        cache_dir=None,
+        wiktionary_fetch_mode="section",
+        offline_dictionary_path=None,
+        offline_dictionary_mode="auto",
+        on_lemmatizer_loaded=None,
     ):
         self.language = language.capitalize()
+        # "section" to fetch only the section for the language from the MediaWiki
+        # API, or "page" to fetch the full Wiktionary page
+        self.wiktionary_fetch_mode = wiktionary_fetch_mode
+        # Pool for making the requests of a lookup concurrently
+        self.executor = ThreadPoolExecutor(max_workers=8)
+        # Identical requests made at the same time (e.g. for a lemma shared by several
+        # words that are looked up at once) share one network call and parse
+        self.in_flight = SingleFlight()
+        # Wiktionary pages and the results parsed from them are cached on disk, if a
+        # cache directory is given
+        self.http_cache = None
+        self.wiktionary_cache = None
+        self.machine_translation_cache = None
+        if cache_dir:
+            # Responses are revalidated after as long as results for missing words
+            # are kept, so that those are looked up online again. Found words are
+            # kept longer in the cache of parsed results.
+            self.http_cache = HTTPCache(
+                cache_dir + "/http_cache.sqlite", ttl=WIKTIONARY_MISSING_TTL
+            )
+            self.wiktionary_cache = DiskCache(cache_dir + "/wiktionary_cache.sqlite")
+            self.machine_translation_cache = MachineTranslationCache(
+                cache_dir + "/machine_translation_cache.sqlite"
+            )
         self.dest_language = dest_language.capitalize()
         if not machine_translator:
             machine_translator == "Google"
-        if machine_translator == "Google":
-            self.google_translator = Translator()
-        elif machine_translator == "GPT":
+        # Google Translate is also used for translating sentences and translating to
+        # a third language
+        self.google_translator = Translator()
+        if machine_translator == "GPT":
             self.gpt_translator = GPTTranslator(self.language, self.dest_language)
         if self.language == "Croatian":
             self.language = "Serbo-Croatian"  # Used in Wiktionary
+        # Wiktionary entries imported from a dump are used before the network. With
+        # mode "auto", words that are not found are looked up online, and with mode
+        # "only", they are not.
+        self.offline_dictionary = None
+        self.offline_dictionary_mode = offline_dictionary_mode
+        if (
+            offline_dictionary_path
+            and offline_dictionary_mode != "off"
+            and os.path.exists(offline_dictionary_path)
+        ):
+            offline_dictionary = OfflineDictionary(offline_dictionary_path)
+            if offline_dictionary.has_language(self.language):
+                self.offline_dictionary = offline_dictionary
+            else:
+                offline_dictionary.close()
         self.use_lemma = use_lemma
         self.machine_translator = machine_translator
         if self.language == "Greek":
             self.use_lemma = False  # Didn't get the lemmatizer to work for Greek
+        self.nlp = None
+        self.nlp_lock = threading.Lock()
+        # Set when the lemmatizer has been loaded, or has failed to load
+        self.nlp_ready = threading.Event()
+        # Called (from another thread) when the lemmatizer has been loaded
+        self.on_lemmatizer_loaded = on_lemmatizer_loaded
         if self.use_lemma:
             print(
                 "Loading models for finding dictionary forms of words to look up (lemmatizer).\n"
                 + "This might take a while, especially the first time for a new language, "
-                + "since the models must be downloaded."
+                + "since the models must be downloaded. Until then, words are looked up "
+                + "with the dictionary forms from Wiktionary."
             )
-            if lemmatizer_dir:
-                if not os.path.exists(lemmatizer_dir):
-                    os.makedirs(lemmatizer_dir)
-                self.nlp = stanza.Pipeline(
-                    get_language_code(language),
-                    lemmatizer_dir,
-                    download_method=stanza.DownloadMethod.REUSE_RESOURCES,
-                    verbose=False,
-                )
-            else:
-                self.nlp = stanza.Pipeline(
-                    get_language_code(language),
+            if lemmatizer_dir and not os.path.exists(lemmatizer_dir):
+                os.makedirs(lemmatizer_dir)
+            # The models are loaded in the background, so that texts can be opened
+            # before they are ready
+            threading.Thread(
+                target=self.load_lemmatizer,
+                args=(get_language_code(language), lemmatizer_dir),
+                daemon=True,
+            ).start()
+        else:
+            self.nlp_ready.set()
+
+    def load_lemmatizer(self, language_code, lemmatizer_dir):
+        """
+        Load the stanza pipeline with only the processors needed for lemmas. Some
+        languages have no multi-word token expansion (mwt), so it is left out for
+        them.
+        """
+        options = {"dir": lemmatizer_dir} if lemmatizer_dir else {}
+        for processors in ["tokenize,mwt,pos,lemma", "tokenize,pos,lemma"]:
+            try:
+                nlp = stanza.Pipeline(
+                    language_code,
+                    processors=processors,
                     download_method=stanza.DownloadMethod.REUSE_RESOURCES,
                     verbose=False,
+                    **options,
                 )
+            except Exception as e:
+                error = e
+                continue
+            self.nlp = nlp
+            self.nlp_ready.set()
             print("The models were loaded.")
-        else:
-            self.nlp = None
+            if self.on_lemmatizer_loaded:
+                self.on_lemmatizer_loaded()
+            return
+        print(f"Could not load the lemmatizer: {error}")
+        self.nlp_ready.set()
+
+    def is_lemmatizer_ready(self):
+        """Whether the lemmatizer has been loaded, or there is none to load"""
+        return self.nlp_ready.is_set()
+
+    def close(self):
+        """
+        Cancel the requests that have not started, without waiting for the others,
+        and close the caches. Lookups still running then fail, but their results
+        are no longer used.
+        """
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for cache in [
+            self.http_cache,
+            self.wiktionary_cache,
+            self.machine_translation_cache,
+            self.offline_dictionary,
+        ]:
+            if cache:
+                cache.close()
 
     def translate(
         self,
@@ -119,50 +239,82 @@ class LegiloTranslator:
         is_phrase=False,
         lemmas=None,
         machine_trans_item=None,
+        context_lemma=None,
     ):
         input_lemmas = lemmas
-        lemmas = set()
-        words_parsed_from_wiktionary = set()
         word = remove_pronunciation_accents(self.language, word)
         word = unicodedata.normalize("NFC", word)
-        results, wiktionary_lemmas = self.parse_from_wiktionary(word)
-        words_parsed_from_wiktionary.add(word)
-        lemmas |= wiktionary_lemmas
 
+        # Wiktionary pages are fetched concurrently, as soon as it is known that they
+        # are needed, and each page only once. The results are merged in a fixed
+        # order below.
+        wiktionary_futures = {}
+
+        def fetch(lookup_word):
+            if lookup_word not in wiktionary_futures:
+                wiktionary_futures[lookup_word] = self.executor.submit(
+                    self.parse_from_wiktionary, lookup_word
+                )
+            return wiktionary_futures[lookup_word]
+
+        lookup_words = [word]
         # Handle that nouns must be looked up with capital letter in German
         if self.language == "German" and len(word) > 0:
             if len(word) == 1:
                 capitalized_word = word.upper()
             else:
                 capitalized_word = word[0].upper() + word[1:]
-            capitalized_results, wiktionary_lemmas = self.parse_from_wiktionary(
-                capitalized_word
+            lookup_words.append(capitalized_word)
+        for lookup_word in lookup_words:
+            fetch(lookup_word)
+        if input_lemmas != None:
+            for lemma in input_lemmas:
+                fetch(unicodedata.normalize("NFC", lemma))
+        machine_trans_future = None
+        if machine_trans == True and not machine_trans_item:
+            machine_trans_future = self.executor.submit(
+                self.get_machine_translation, word
             )
-            words_parsed_from_wiktionary.add(capitalized_word)
-            results += capitalized_results
+
+        # Find lemma using NLP model, unless it has been found from the context of
+        # the word, and fetch its page in advance in case it is used
+        nlp_lemma = None
+        if input_lemmas == None and self.use_lemma and not is_phrase:
+            # Before the lemmatizer is loaded, only lemmas from Wiktionary are used
+            nlp_lemma = context_lemma or self.get_lemma(word)
+            if nlp_lemma:
+                nlp_lemma = unicodedata.normalize("NFC", nlp_lemma.lower())
+            if nlp_lemma and nlp_lemma != word.lower():
+                fetch(nlp_lemma)
+
+        results = []
+        lemmas = set()
+        words_parsed_from_wiktionary = set()
+        for lookup_word in lookup_words:
+            lookup_results, wiktionary_lemmas = fetch(lookup_word).result()
+            words_parsed_from_wiktionary.add(lookup_word)
+            results += lookup_results
             lemmas |= wiktionary_lemmas
 
         if input_lemmas != None:
             lemmas = input_lemmas
 
         lemmas = {unicodedata.normalize("NFC", lemma) for lemma in lemmas}
-        for lemma in lemmas:
-            if lemma not in words_parsed_from_wiktionary:
-                results += self.parse_from_wiktionary(lemma)[0]
-                words_parsed_from_wiktionary.add(lemma)
+        results += self.get_wiktionary_results_for_lemmas(
+            lemmas, words_parsed_from_wiktionary, fetch
+        )
 
-        # Find lemmas using NLP model
-        if input_lemmas == None and self.use_lemma and not is_phrase:
-            nlp_lemma = self.get_lemma(word).lower()
+        # Use lemma from NLP model
+        if nlp_lemma:
             lookup_words_from_result = self.get_lookup_words_from_results(results)
             if (
                 nlp_lemma not in lemmas
                 and nlp_lemma != word.lower()
                 and nlp_lemma not in lookup_words_from_result
             ):
-                nlp_lemma = unicodedata.normalize("NFC", nlp_lemma)
+                wiktionary_res = []
                 if nlp_lemma not in words_parsed_from_wiktionary:
-                    wiktionary_res = self.parse_from_wiktionary(nlp_lemma)[0]
+                    wiktionary_res = fetch(nlp_lemma).result()[0]
                     words_parsed_from_wiktionary.add(nlp_lemma)
                 if len(wiktionary_res) > 0:
                     results += wiktionary_res
@@ -176,7 +328,9 @@ class LegiloTranslator:
         if (
             machine_trans == "auto" and "Wiktionary" not in result_sources
         ) or machine_trans == True:
-            if not machine_trans_item:
+            if machine_trans_future:
+                machine_trans_item = machine_trans_future.result()[0]
+            elif not machine_trans_item:
                 machine_trans_item = self.get_machine_translation(word)[0]
             results += [machine_trans_item]
 
@@ -186,13 +340,26 @@ class LegiloTranslator:
                 lemmas.add(lemma)
 
         lemmas = {unicodedata.normalize("NFC", lemma) for lemma in lemmas}
-        for lemma in lemmas:
-            if lemma not in words_parsed_from_wiktionary:
-                results += self.parse_from_wiktionary(lemma)[0]
-                words_parsed_from_wiktionary.add(lemma)
+        results += self.get_wiktionary_results_for_lemmas(
+            lemmas, words_parsed_from_wiktionary, fetch
+        )
 
         return results, lemmas
 
+    def get_wiktionary_results_for_lemmas(self, lemmas, parsed_words, fetch):
+        """
+        Get the Wiktionary results for the lemmas that are not already parsed. All
+        pages are requested before waiting for any of them.
+        """
+        lemmas_to_parse = [lemma for lemma in lemmas if lemma not in parsed_words]
+        for lemma in lemmas_to_parse:
+            fetch(lemma)
+        results = []
+        for lemma in lemmas_to_parse:
+            results += fetch(lemma).result()[0]
+            parsed_words.add(lemma)
+        return results
+
     def get_info(
         self,
         word,
@@ -202,8 +369,12 @@ class LegiloTranslator:
         is_phrase=False,
         word_lemmas=None,
         machine_trans_item=None,
+        context_lemma=None,
     ):
-        """Get word info, including translation, on the format used in Legilo"""
+        """
+        Get word info, including translation, on the format used in Legilo.
+        `context_lemma` is the lemma found for the word in its context in the text.
+        """
         remark_line_marker = "\u2022 "
         translation, lemmas = self.translate(
             word,
@@ -211,6 +382,7 @@ class LegiloTranslator:
             machine_trans=include_machine_trans,
             lemmas=word_lemmas,
             machine_trans_item=machine_trans_item,
+            context_lemma=context_lemma,
         )
         wordtypes = set()
         genders = set()
@@ -256,13 +428,38 @@ class LegiloTranslator:
 
     def get_lemma(self, word):
         """
-        Get the dictionary form (lemma) of a given word.
+        Get the dictionary form (lemma) of a given word, or None if the lemmatizer
+        isn't loaded.
         """
-        doc = self.nlp(word)
+        if not self.nlp:
+            return None
+        with self.nlp_lock:  # The pipeline may not be used by several threads at once
+            doc = self.nlp(word)
         lemma = doc.sentences[0].words[0].lemma
         lemma = unicodedata.normalize("NFC", lemma)
         return lemma
 
+    def lemmatize_text(self, text):
+        """
+        Get the lemmas of the words of a text in their context, with one call of the
+        pipeline for the whole text. Returns a list of (start index, end index,
+        lemma) for the tokens of the text.
+        """
+        if not self.nlp or not text.strip():
+            return []
+        with self.nlp_lock:
+            doc = self.nlp(text)
+        token_lemmas = []
+        for sentence in doc.sentences:
+            for token in sentence.tokens:
+                # Like in get_lemma, the first word is used for tokens with several
+                # words (e.g. French "du" = "de le")
+                lemma = token.words[0].lemma
+                if lemma:
+                    lemma = unicodedata.normalize("NFC", lemma)
+                    token_lemmas.append((token.start_char, token.end_char, lemma))
+        return token_lemmas
+
     def get_lemma_from_machine_trans(self, machine_trans_item):
         if not "definitions" in machine_trans_item:
             return None
@@ -304,13 +501,87 @@ class LegiloTranslator:
                 sources.add(item["source"])
         return sources
 
+    def google_translate(self, text, src, dest):
+        """
+        Translate text with Google Translate between the languages with codes src and
+        dest, using the cached translation if there is one
+        """
+        cache_args = self.get_google_cache_args(src, dest, text)
+        if self.machine_translation_cache:
+            trans = self.machine_translation_cache.get(*cache_args)
+            if trans is not None:
+                return trans
+        trans = self.google_translator.translate(text, src=src, dest=dest).text
+        if self.machine_translation_cache:
+            self.machine_translation_cache.set(*cache_args, trans)
+        return trans
+
+    def get_google_cache_args(self, src, dest, text):
+        return (
+            "Google",
+            GOOGLE_TRANSLATE_MODEL,
+            GOOGLE_TRANSLATE_PROMPT_VERSION,
+            src,
+            dest,
+            text,
+        )
+
+    def google_translate_batch(self, texts, src, dest):
+        """
+        Translate several texts with Google Translate, as lines of one request. If
+        the lines of the translation don't match the texts, they are translated
+        concurrently one at a time instead. Cached translations are reused.
+        """
+        translations = {}
+        texts_to_translate = []
+        for text in texts:
+            if text in translations or text in texts_to_translate:
+                continue
+            trans = None
+            if self.machine_translation_cache:
+                trans = self.machine_translation_cache.get(
+                    *self.get_google_cache_args(src, dest, text)
+                )
+            if trans is not None:
+                translations[text] = trans
+            else:
+                texts_to_translate.append(text)
+
+        # Texts with line breaks can't be told apart in the translation of the lines
+        lines = [text for text in texts_to_translate if "\n" not in text]
+        if len(lines) > 1:
+            try:
+                trans_lines = self.google_translator.translate(
+                    "\n".join(lines), src=src, dest=dest
+                ).text.split("\n")
+            except Exception as e:
+                print(f"Batch translation failed, translating one at a time: {e}")
+                trans_lines = []
+            if len(trans_lines) == len(lines):
+                for text, trans in zip(lines, trans_lines):
+                    trans = trans.strip()
+                    translations[text] = trans
+                    if self.machine_translation_cache:
+                        self.machine_translation_cache.set(
+                            *self.get_google_cache_args(src, dest, text), trans
+                        )
+
+        futures = {
+            text: self.executor.submit(self.google_translate, text, src, dest)
+            for text in texts_to_translate
+            if text not in translations
+        }
+        for text, future in futures.items():
+            translations[text] = future.result()
+        return [translations[text] for text in texts]
+
     def get_google_translation(self, word):
         try:
-            trans = self.google_translator.translate(
+            trans = self.google_translate(
                 word,
-                src=get_language_code(self.language),
-                dest=get_language_code(self.dest_language),
-            ).text
+                get_language_code(self.language),
+                get_language_code(self.dest_language),
+            )
         except:
             trans = "[Google Translate error]"
         if trans == word:
@@ -325,11 +596,42 @@ class LegiloTranslator:
         return results
 
     def get_gpt_translation(self, word):
+        result = self.get_cached_gpt_result(word)
+        if result is None:
+            try:
+                result = self.gpt_translator.translate(word)
+            except:
+                result = {"error": "[GPT translator error]"}
+            self.cache_gpt_result(word, result)
+        return self.convert_gpt_result(word, result)
+
+    def get_gpt_cache_args(self, text):
+        translator = self.gpt_translator
+        return (
+            "GPT",
+            translator.MODEL,
+            translator.PROMPT_VERSION,
+            translator.src,
+            translator.dest,
+            text,
+        )
+
+    def get_cached_gpt_result(self, text):
+        if not self.machine_translation_cache:
+            return None
+        return self.machine_translation_cache.get(*self.get_gpt_cache_args(text))
+
+    def cache_gpt_result(self, text, result):
+        """Cache a result of GPTTranslator, unless it is an error"""
+        if self.machine_translation_cache and "error" not in result:
+            self.machine_translation_cache.set(*self.get_gpt_cache_args(text), result)
+
+    def convert_gpt_result(self, word, result):
+        """Convert a result of GPTTranslator to the format of the lookup results"""
         trans = "?"
         base_form = word
         num_words = len(word.split())
         try:
-            result = self.gpt_translator.translate(word)
             if "error" in result:
                 trans = result["error"]
             elif num_words == 1:
@@ -360,19 +662,201 @@ class LegiloTranslator:
         return results
 
     def get_machine_translation(self, word):
+        return self.in_flight.do(
+            ("machine_translation", word), self.make_machine_translation, word
+        )
+
+    def make_machine_translation(self, word):
         if self.machine_translator == "GPT":
             return self.get_gpt_translation(word)
         else:  # self.machine_translator == "Google"
             return self.get_google_translation(word)
 
+    def get_machine_translations(self, words, contexts=None):
+        """
+        Get the machine translations of several words or sentences. With GPT, they
+        are translated with one request per batch instead of one per word.
+        """
+        if contexts is None:
+            contexts = [None] * len(words)
+        keys = [("machine_translation", word) for word in words]
+        return self.in_flight.do_batch(
+            keys, self.make_machine_translations, list(zip(words, contexts))
+        )
+
+    def make_machine_translations(self, words_and_contexts):
+        words = [word for word, _ in words_and_contexts]
+        if self.machine_translator != "GPT":
+            return [self.make_machine_translation(word) for word in words]
+        contexts = [context for _, context in words_and_contexts]
+        results = [self.get_cached_gpt_result(word) for word in words]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            try:
+                batch_results = self.gpt_translator.translate_batch(
+                    [words[i] for i in missing], [contexts[i] for i in missing]
+                )
+            except Exception as e:
+                print(f"An error occurred when translating a batch of words: {e}")
+                batch_results = [{"error": "[GPT translator error]"}] * len(missing)
+            for i, result in zip(missing, batch_results):
+                results[i] = result
+                self.cache_gpt_result(words[i], result)
+        return [
+            self.convert_gpt_result(word, result)
+            for word, result in zip(words, results)
+        ]
+
+    def prefetch_machine_translations(self, words, contexts=None):
+        """
+        Translate words with batched requests, if the machine translator supports
+        it, so that their machine translations are in the cache when looked up
+        """
+        if self.machine_translator != "GPT" or not self.machine_translation_cache:
+            return
+        if words:
+            self.get_machine_translations(words, contexts)
+
     def parse_from_wiktionary(self, word):
-        lemmas = set()
+        """
+        Get the results and lemmas for word from Wiktionary, using the cached results
+        if the page has been parsed before
+        """
+        return self.in_flight.do(("wiktionary", word), self.look_up_in_wiktionary, word)
+
+    def look_up_in_wiktionary(self, word):
+        if self.offline_dictionary:
+            results, lemmas = self.offline_dictionary.lookup(self.language, word)
+            if results or self.offline_dictionary_mode == "only":
+                return results, lemmas
+
+        cache_key = f"{WIKTIONARY_PARSER_VERSION}:{self.language}:{word}"
+        if self.wiktionary_cache:
+            cached = self.wiktionary_cache.get(cache_key)
+            if cached:
+                return cached
+
+        content = self.fetch_wiktionary_page(word)
+        if content is False:  # Not cached, so that the page is fetched next time
+            return [], set()
+        if content is None:
+            results, lemmas = [], set()
+        else:
+            results, lemmas = self.parse_wiktionary_html(content)
+        if self.wiktionary_cache:
+            ttl = WIKTIONARY_CACHE_TTL if results else WIKTIONARY_MISSING_TTL
+            self.wiktionary_cache.set(cache_key, (results, lemmas), ttl)
+        return results, lemmas
+
+    def fetch_wiktionary_page(self, word):
+        """
+        Get the HTML of the Wiktionary page for word, or of its section for the
+        current language. Returns None if not found, or False if the page couldn't
+        be fetched.
+        """
+        if self.wiktionary_fetch_mode == "section":
+            content = self.fetch_wiktionary_section(word)
+            if content is not False:
+                return content
+        return self.fetch_full_wiktionary_page(word)
+
+    def fetch_wiktionary_section(self, word):
+        """
+        Get the HTML of the section for the current language of the Wiktionary page
+        for word, using the MediaWiki parse API. Returns None if there is no such
+        section, or False if the API couldn't be used.
+        """
+        section_index = self.get_wiktionary_section_index(word)
+        if section_index is None or section_index is False:
+            return section_index
+        data = self.get_from_wiktionary_api(
+            {
+                "action": "parse",
+                "page": word,
+                "section": section_index,
+                "prop": "text",
+                "redirects": 1,
+                "disabletoc": 1,
+                "format": "json",
+                "formatversion": 2,
+            }
+        )
+        if not data or "parse" not in data:
+            return False
+        content = data["parse"]["text"]
+        if f'id="{self.language}"' not in content:
+            # The sections of the page have changed since the index was cached
+            if self.wiktionary_cache:
+                self.wiktionary_cache.delete(f"sections:{word}")
+            return False
+        return content
+
+    def get_wiktionary_section_index(self, word):
+        """
+        Get the index of the section for the current language of the Wiktionary page
+        for word, or None if there is no such section, or False if the API couldn't
+        be used. The section indices of each page are cached.
+        """
+        cache_key = f"sections:{word}"
+        sections = None
+        if self.wiktionary_cache:
+            sections = self.wiktionary_cache.get(cache_key)
+        if sections is None:
+            data = self.get_from_wiktionary_api(
+                {
+                    "action": "parse",
+                    "page": word,
+                    "prop": "sections",
+                    "redirects": 1,
+                    "format": "json",
+                    "formatversion": 2,
+                }
+            )
+            if not data:
+                return False
+            if "error" in data:
+                if data["error"].get("code") != "missingtitle":
+                    return False
+                sections = {}  # The page doesn't exist
+            else:
+                sections = {
+                    section["anchor"]: section["index"]
+                    for section in data["parse"]["sections"]
+                    if str(section["level"]) == "2"
+                }
+            if self.wiktionary_cache:
+                if self.language in sections:
+                    ttl = WIKTIONARY_CACHE_TTL
+                else:  # No section for the language, or no page
+                    ttl = WIKTIONARY_MISSING_TTL
+                self.wiktionary_cache.set(cache_key, sections, ttl)
+        return sections.get(self.language)
+
+    def get_from_wiktionary_api(self, params):
+        """Get the decoded JSON response from the MediaWiki API, or None on failure"""
+        url = "https://en.wiktionary.org/w/api.php?" + urlencode(params)
+        try:
+            response = self.get_url(url)
+        except requests.exceptions.RequestException as e:
+            print(f"An error occurred when using the Wiktionary API: {e}")
+            return None
+        if response.status_code != 200:
+            return None
+        try:
+            return json.loads(response.content)
+        except ValueError as e:
+            print(f"Could not decode the response from the Wiktionary API: {e}")
+            return None
 
+    def fetch_full_wiktionary_page(self, word):
+        """
+        Get the HTML of the full Wiktionary page for word, or None if not found, or
+        False if the page couldn't be fetched
+        """
         url = f"https://en.wiktionary.org/wiki/{word}"
-        headers = {"User-Agent": "Legilo (https://github.com/christianrosdahl/legilo)"}
         response = None
         try:
-            response = requests.get(url, headers=headers, timeout=10)
+            response = self.get_url(url)
         except requests.exceptions.HTTPError as http_err:
             print(f"HTTP error occurred: {http_err}")
         except requests.exceptions.ConnectionError as conn_err:
@@ -384,10 +868,18 @@ class LegiloTranslator:
         except Exception as general_err:
             print(f"An unexpected error occurred: {general_err}")
 
-        if not response or response.status_code != 200:
-            return [], lemmas
+        if not response:
+            return False
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            return False
+        return response.content
 
-        soup = BeautifulSoup(response.content, "html.parser")
+    def parse_wiktionary_html(self, content):
+        """Parse the section for the current language of a Wiktionary page"""
+        lemmas = set()
+        soup = BeautifulSoup(content, "html.parser")
 
         # Remove all <link> tags, while keeping their content
         for link_tag in soup.find_all("link"):
@@ -486,6 +978,12 @@ class LegiloTranslator:
 
         return results, lemmas
 
+    def get_url(self, url):
+        """Get url, using the HTTP cache if available"""
+        if self.http_cache:
+            return self.http_cache.get(url)
+        return http_client.get(url)
+
     def is_etymology(self, element):
         if element.name == "div" and "mw-heading" in element.get("class", []):
             header_tag = element.find(["h3", "h4"])
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Export and import of the vocabulary of a language as JSON Lines, with one record per
+word, phrase or personal translation. Records are written and read one at a time,
+so that large vocabularies can be processed without loading them at once.
+
+Usage:
+    python vocabulary_jsonl.py export <language> <file> [--data-dir data]
+    python vocabulary_jsonl.py import <language> <file> [--data-dir data]
+"""
+
+import argparse
+import json
+import os
+
+# Number of imported records between writes of the changes to disk
+IMPORT_FLUSH_INTERVAL = 1000
+
+
+def export_vocabulary(data, path):
+    """Write all words, phrases and personal translations of `data` to `path`"""
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    num_records = 0
+    exported_translations = set()
+    with open(path, "w", encoding="utf-8") as f:
+        for word in list(data.word_status):
+            category = data.get_category(word)
+            info = data.read_info(word)
+            record = {"type": "word", "word": word, "category": category}
+            record.update(split_lemmas(info))
+            personal_translation = data.get_personal_translation(word)
+            if personal_translation:
+                record["personal_translation"] = personal_translation
+                exported_translations.add(word)
+            write_record(f, record)
+            num_records += 1
+        for first_word in list(data.phrases):
+            for info in data.phrases[first_word]:
+                phrase = " ".join(info["phrase_words"])
+                record = {"type": "phrase", "phrase": phrase}
+                record.update(split_lemmas(info))
+                personal_translation = data.get_personal_translation(phrase)
+                if personal_translation:
+                    record["personal_translation"] = personal_translation
+                    exported_translations.add(phrase)
+                write_record(f, record)
+                num_records += 1
+        # Personal translations of words that are not saved in any category, e.g.
+        # lemmas of looked up words
+        for word in list(data.personal_translations):
+            if word in exported_translations:
+                continue
+            record = {
+                "type": "personal_translation",
+                "word": word,
+                "personal_translation": data.personal_translations[word],
+            }
+            write_record(f, record)
+            num_records += 1
+    return num_records
+
+
+def import_vocabulary(data, path):
+    """
+    Add the records in `path` to `data`. Existing words and phrases are replaced by
+    the imported ones.
+    """
+    num_records = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line_num, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                import_record(data, json.loads(line))
+            except (ValueError, KeyError) as e:
+                print(f"Skipped invalid record on line {line_num}: {e}")
+                continue
+            num_records += 1
+            if num_records % IMPORT_FLUSH_INTERVAL == 0:
+                data.flush()
+    data.save()
+    return num_records
+
+
+def import_record(data, record):
+    """Add one record to `data`, raising ValueError or KeyError if it is invalid"""
+    if not isinstance(record, dict):
+        raise ValueError("the record is not an object")
+    record_type = record["type"]
+    personal_translation = record.get("personal_translation")
+    if personal_translation is not None and not isinstance(personal_translation, str):
+        raise ValueError("personal_translation is not a string")
+    if record_type == "word":
+        word = get_word(record)
+        category = record["category"]
+        info = join_lemmas(record)
+        if category == "learning":
+            data.add_to_learning(word, info)
+        elif category == "known":
+            data.add_to_known(word, info)
+        elif category == "ignored":
+            data.add_to_ignored(word)
+        else:
+            raise ValueError(f"unknown category '{category}'")
+    elif record_type == "phrase":
+        word = record["phrase"]
+        info = join_lemmas(record)
+        if info is None or not isinstance(info.get("phrase_words"), list):
+            raise ValueError("the info of the phrase has no list of phrase_words")
+        data.add_to_phrases(info)
+    elif record_type == "personal_translation":
+        word = get_word(record)
+    else:
+        raise ValueError(f"unknown record type '{record_type}'")
+    if personal_translation:
+        data.add_personal_translation(word, personal_translation)
+
+
+def split_lemmas(info):
+    """Get the lemmas and the rest of the info as separate record fields"""
+    if not info:
+        return {"info": info}
+    fields = {}
+    if "lemmas" in info:
+        fields["lemmas"] = sorted(info["lemmas"])
+        info = {key: value for key, value in info.items() if key != "lemmas"}
+    fields["info"] = info
+    return fields
+
+
+def join_lemmas(record):
+    info = record["info"]
+    if info is not None and not isinstance(info, dict):
+        raise ValueError("info is not an object")
+    if "lemmas" in record:
+        lemmas = record["lemmas"]
+        if not isinstance(lemmas, list) or not all(
+            isinstance(lemma, str) for lemma in lemmas
+        ):
+            raise ValueError("lemmas is not a list of strings")
+        if info is None:
+            raise ValueError("lemmas are given without info")
+        info["lemmas"] = set(lemmas)
+    return info
+
+
+def get_word(record):
+    word = record["word"]
+    if not isinstance(word, str):
+        raise ValueError("word is not a string")
+    return word
+
+
+def write_record(f, record):
+    f.write(json.dumps(record, ensure_ascii=False, default=to_json) + "\n")
+
+
+def to_json(obj):
+    """Convert objects that are not supported by JSON, like sets"""
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export or import the vocabulary of a language as JSON Lines"
+    )
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("language")
+    parser.add_argument("file")
+    parser.add_argument("--data-dir", default="data")
+    args = parser.parse_args()
+
+    from data_handler import DataHandler
+
+    with open("config.json", "r") as f:
+        config = json.load(f)
+    data = DataHandler(
+        args.data_dir, args.language, config.get("storage_engine", "pickle")
+    )
+    try:
+        if args.command == "export":
+            num_records = export_vocabulary(data, args.file)
+            print(f"Exported {num_records} records to {args.file}")
+        else:
+            num_records = import_vocabulary(data, args.file)
+            print(f"Imported {num_records} records from {args.file}")
+    finally:
+        data.close()
+
+
+if __name__ == "__main__":
+    main()